@@ -1,22 +1,9 @@
 """coding-in-parallel package."""
 
-from . import (
-    ast_index,
-    config,
-    controller,
-    gates,
-    investigator,
-    llm,
-    logging,
-    main,
-    planner,
-    proposer,
-    localize,
-    tnr,
-    types,
-    validate,
-    vcs,
-)  # noqa: F401
+from __future__ import annotations
+
+import importlib
+from typing import Any, List
 
 __all__ = [
     "ast_index",
@@ -35,3 +22,15 @@ __all__ = [
     "validate",
     "vcs",
 ]
+
+
+def __getattr__(name: str) -> Any:
+    # Submodules load on first access, so importing one (e.g. ``gates``)
+    # does not pull in the controller, planner and proposer stack as well.
+    if name in __all__:
+        return importlib.import_module(f".{name}", __name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__() -> List[str]:
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,45 @@
+"""Repository tree walking shared by the static gate and the AST index."""
+
+from __future__ import annotations
+
+import os
+from typing import Dict, Iterator
+
+# Directories never part of the code under test: VCS metadata, environments,
+# caches and our own run artifacts. Pruned before descending, at any depth.
+SKIP_DIRS = frozenset({
+    ".git", ".hg", ".svn", ".venv", "venv", ".tox", ".nox", ".eggs",
+    "__pycache__", "node_modules", ".agent_runs",
+})
+# Build output, pruned only at the repo root: a nested ``build`` or ``dist``
+# directory is as likely to be a real package (e.g. ``myproj/build/``).
+ROOT_SKIP_DIRS = SKIP_DIRS | {"build", "dist"}
+# A file or directory modified this recently could change again without its
+# mtime moving (coarse filesystem timestamps), so it is not trusted as
+# unchanged yet.
+RACY_MTIME_NS = 2_000_000_000
+# Batches smaller than this cost more in worker start-up than they save, so
+# they are processed in-process instead.
+PARALLEL_MIN_FILES = 32
+
+
+def walk_python_files(root: str, dir_mtimes: Dict[str, int] | None = None) -> Iterator[os.DirEntry[str]]:
+    """Yield the ``.py`` files under *root*, optionally recording directory mtimes."""
+
+    # DirEntry carries the file type from readdir, so no extra stat per entry.
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        skip = ROOT_SKIP_DIRS if directory == root else SKIP_DIRS
+        try:
+            if dir_mtimes is not None:
+                dir_mtimes[directory] = os.stat(directory).st_mtime_ns
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.name not in skip:
+                            stack.append(entry.path)
+                    elif entry.name.endswith(".py") and entry.is_file(follow_symlinks=False):
+                        yield entry
+        except OSError:
+            continue
@@ -0,0 +1,55 @@
+"""JSON encode/decode helpers that prefer orjson when it is installed.
+
+orjson is an optional extra (``pip install -e .[fast]``); without it these
+fall back to the stdlib with matching output shape. Dataclass instances
+serialize as objects of their fields either way.
+"""
+
+from __future__ import annotations
+
+import dataclasses
+import json
+from typing import Any
+
+try:  # optional C-accelerated serializer
+    import orjson
+except ImportError:  # pragma: no cover - depends on environment
+    orjson = None  # type: ignore[assignment]
+
+# orjson.JSONDecodeError subclasses this, so callers can catch one type.
+JSONDecodeError = json.JSONDecodeError
+
+
+def _default(obj: Any) -> Any:
+    if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        return {f.name: getattr(obj, f.name) for f in dataclasses.fields(obj)}
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def loads(data: str | bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps_bytes(obj: Any, *, indent: bool = False, sort_keys: bool = False) -> bytes:
+    """Serialize to UTF-8 bytes; compact unless ``indent`` (two spaces)."""
+
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, option=option)
+    return dumps(obj, indent=indent, sort_keys=sort_keys).encode("utf-8")
+
+
+def dumps(obj: Any, *, indent: bool = False, sort_keys: bool = False) -> str:
+    if orjson is not None:
+        return dumps_bytes(obj, indent=indent, sort_keys=sort_keys).decode("utf-8")
+    if indent:
+        return json.dumps(obj, ensure_ascii=False, indent=2, sort_keys=sort_keys, default=_default)
+    return json.dumps(
+        obj, ensure_ascii=False, separators=(",", ":"), sort_keys=sort_keys, default=_default
+    )
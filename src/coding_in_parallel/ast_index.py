@@ -3,11 +3,20 @@
 from __future__ import annotations
 
 import ast
-from dataclasses import dataclass
+import functools
+import hashlib
+import json
+import os
+import pickle
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from itertools import repeat
 from pathlib import Path
-from typing import Dict, Iterable, List, Mapping
+from typing import Callable, Dict, FrozenSet, Iterable, List, Mapping, Optional, Sequence, Tuple
 
-from . import types
+from . import _fs, types
 
 
 @dataclass
@@ -15,21 +24,62 @@ class AstIndex:
     """In-memory representation of symbols and call-sites."""
 
     root: Path
-    _symbols: Mapping[str, List[types.AstSpan]]
-    _calls: Mapping[str, List[types.AstSpan]]
-    _file_cache: Mapping[str, List[str]]
+    _symbols: Mapping[str, Tuple[types.AstSpan, ...]]
+    _calls: Mapping[str, Tuple[types.AstSpan, ...]]
+    _file_cache: Dict[str, bytes]
+    _offsets: Callable[[str], List[int]] = field(init=False, repr=False, compare=False)
+    # file -> symbol spans and call name -> calling files, grouped on first use.
+    _symbols_by_file: Dict[str, List[types.AstSpan]] | None = field(
+        init=False, default=None, repr=False, compare=False
+    )
+    _call_files: Dict[str, FrozenSet[str]] = field(
+        init=False, default_factory=dict, repr=False, compare=False
+    )
 
-    def lookup_symbol(self, symbol: str) -> List[types.AstSpan]:
-        return list(self._symbols.get(symbol, []))
+    def __post_init__(self) -> None:
+        # Source is kept as raw bytes; line-start offsets are only computed for
+        # the handful of files that actually get sliced.
+        self._offsets = functools.lru_cache(maxsize=128)(self._line_offsets)
 
-    def lookup_calls(self, name: str) -> List[types.AstSpan]:
-        return list(self._calls.get(name, []))
+    def _line_offsets(self, file: str) -> List[int]:
+        offsets = [0]
+        for line in self._file_cache[file].splitlines(keepends=True):
+            offsets.append(offsets[-1] + len(line))
+        return offsets
+
+    def __contains__(self, file: object) -> bool:
+        return file in self._file_cache
+
+    def refresh(self, files: Iterable[str]) -> None:
+        """Reload the source of *files* from disk after they were edited."""
+
+        for file in files:
+            path = self.root / file
+            if path.is_file():
+                self._file_cache[file] = path.read_bytes()
+            else:
+                self._file_cache.pop(file, None)
+        self._offsets.cache_clear()
+
+    def lookup_symbol(self, symbol: str) -> Sequence[types.AstSpan]:
+        return self._symbols.get(symbol, ())
+
+    def lookup_calls(self, name: str) -> Sequence[types.AstSpan]:
+        return self._calls.get(name, ())
+
+    def call_files(self, name: str) -> FrozenSet[str]:
+        """Relative paths of the files that call ``name``."""
+        files = self._call_files.get(name)
+        if files is None:
+            files = self._call_files[name] = frozenset(span.file for span in self.lookup_calls(name))
+        return files
 
     def slice(self, file: str, start_line: int, end_line: int, padding: int = 0) -> str:
-        lines = self._file_cache[file]
-        start = max(start_line - 1 - padding, 0)
-        end = min(end_line + padding, len(lines))
-        return "".join(lines[start:end])
+        data = self._file_cache[file]
+        offsets = self._offsets(file)
+        start = min(max(start_line - 1 - padding, 0), len(offsets) - 1)
+        end = min(end_line + padding, len(offsets) - 1)
+        return data[offsets[start] : offsets[max(start, end)]].decode("utf-8", errors="replace")
 
     # Public helpers for localization
     def iter_symbol_spans(self) -> Iterable[types.AstSpan]:
@@ -40,7 +90,12 @@ class AstIndex:
 
     def spans_in_file(self, file: str) -> List[types.AstSpan]:
         """Return all symbol spans that belong to a given relative file path."""
-        return [s for s in self.iter_symbol_spans() if s.file == file]
+        if self._symbols_by_file is None:
+            grouped: Dict[str, List[types.AstSpan]] = {}
+            for span in self.iter_symbol_spans():
+                grouped.setdefault(span.file, []).append(span)
+            self._symbols_by_file = grouped
+        return list(self._symbols_by_file.get(file, ()))
 
     def find_spans_covering(self, file: str, line: int) -> List[types.AstSpan]:
         """Find symbol spans in `file` that enclose `line` (1-based)."""
@@ -51,22 +106,38 @@ class AstIndex:
         ]
 
 
-class _CallVisitor(ast.NodeVisitor):
-    def __init__(self, file: str, calls: Dict[str, List[types.AstSpan]]):
-        self.file = file
+# (symbol, start_line, end_line, node_type) as produced by _IndexVisitor.
+_SpanRow = Tuple[str, int, int, str]
+
+
+class _IndexVisitor(ast.NodeVisitor):
+    """Collect symbol definitions and call-sites in a single traversal.
+
+    Spans are recorded as plain tuples so worker processes ship cheap rows
+    back to :func:`build_index`, which materialises interned spans.
+    """
+
+    def __init__(self, symbols: List[_SpanRow], calls: List[_SpanRow]):
+        self.symbols = symbols
         self.calls = calls
 
+    def _add_symbol(self, node: ast.FunctionDef | ast.AsyncFunctionDef | ast.ClassDef, node_type: str) -> None:
+        self.symbols.append((node.name, node.lineno, getattr(node, "end_lineno", node.lineno), node_type))
+        self.generic_visit(node)
+
+    def visit_FunctionDef(self, node: ast.FunctionDef) -> None:
+        self._add_symbol(node, "FunctionDef")
+
+    def visit_AsyncFunctionDef(self, node: ast.AsyncFunctionDef) -> None:
+        self._add_symbol(node, "FunctionDef")
+
+    def visit_ClassDef(self, node: ast.ClassDef) -> None:
+        self._add_symbol(node, "ClassDef")
+
     def visit_Call(self, node: ast.Call) -> None:  # pragma: no cover - simple delegation
         name = self._call_name(node.func)
         if name:
-            span = types.AstSpan(
-                file=self.file,
-                start_line=node.lineno,
-                end_line=getattr(node, "end_lineno", node.lineno),
-                node_type="Call",
-                symbol=name,
-            )
-            self.calls.setdefault(name, []).append(span)
+            self.calls.append((name, node.lineno, getattr(node, "end_lineno", node.lineno), "Call"))
         self.generic_visit(node)
 
     @staticmethod
@@ -78,51 +149,312 @@ class _CallVisitor(ast.NodeVisitor):
         return None
 
 
-def _walk_python_files(repo_path: Path) -> Iterable[Path]:
-    for path in repo_path.rglob("*.py"):
-        if path.is_file():
-            yield path
+# Third-party code we only need top-level names from.
+_VENDORED_DIRS = frozenset({"vendor", "_vendor", "vendored", "third_party", "site-packages"})
 
 
-def build_index(repo_path: Path | str) -> AstIndex:
-    """Build an :class:`AstIndex` for the given repository."""
+def _relative(root: Path, entry: os.DirEntry[str]) -> str:
+    return Path(entry.path).relative_to(root).as_posix()
 
-    root = Path(repo_path)
-    symbol_map: Dict[str, List[types.AstSpan]] = {}
-    call_map: Dict[str, List[types.AstSpan]] = {}
-    file_cache: Dict[str, List[str]] = {}
 
-    for file_path in _walk_python_files(root):
-        rel = file_path.relative_to(root).as_posix()
-        text = file_path.read_text()
-        file_cache[rel] = text.splitlines(keepends=True)
+def _list_python_files(root: Path, cache_dir: Path | None) -> List[str]:
+    """Return repo-relative Python paths, reusing the cached listing when possible.
+
+    Adding, removing or renaming an entry bumps its parent directory's mtime,
+    so the listing is still valid as long as every walked directory is
+    unchanged; checking that costs one stat per directory instead of a walk.
+    """
+
+    if cache_dir is None:
+        return [_relative(root, entry) for entry in _fs.walk_python_files(str(root))]
+    listing = cache_dir / "files.json"
+    root_key = str(root.resolve())
+    try:
+        cached = json.loads(listing.read_text())
+        if cached["root"] == root_key and all(
+            os.stat(root / rel).st_mtime_ns == mtime for rel, mtime in cached["dirs"].items()
+        ):
+            return list(cached["files"])
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    dir_mtimes: Dict[str, int] = {}
+    files = [_relative(root, entry) for entry in _fs.walk_python_files(str(root), dir_mtimes)]
+    dirs = {Path(directory).relative_to(root).as_posix(): mtime for directory, mtime in dir_mtimes.items()}
+    # Like git's racy-clean check: a directory touched within the mtime
+    # granularity could change again without its mtime moving, so only
+    # persist listings whose directories have been quiet for a while.
+    try:
+        if max(dirs.values(), default=0) < time.time_ns() - _fs.RACY_MTIME_NS:
+            listing.write_text(json.dumps({"root": root_key, "dirs": dirs, "files": files}))
+        else:
+            listing.unlink(missing_ok=True)
+    except OSError:
+        pass
+    return files
+
+
+def _is_vendored(rel: str) -> bool:
+    return not _VENDORED_DIRS.isdisjoint(rel.split("/")[:-1])
+
+
+def _is_literal(node: ast.AST | None) -> bool:
+    if isinstance(node, ast.Constant):
+        return True
+    if isinstance(node, (ast.List, ast.Tuple, ast.Set)):
+        return all(isinstance(elt, ast.Constant) for elt in node.elts)
+    return False
+
+
+def _is_trivial_stmt(node: ast.stmt) -> bool:
+    """True for module-level statements that cannot contain defs or calls."""
+
+    if isinstance(node, (ast.Import, ast.ImportFrom, ast.Pass, ast.Global)):
+        return True
+    if isinstance(node, ast.Expr):
+        return isinstance(node.value, ast.Constant)
+    if isinstance(node, ast.Assign):
+        return all(isinstance(t, ast.Name) for t in node.targets) and _is_literal(node.value)
+    if isinstance(node, ast.AnnAssign):
+        # The annotation is code too, e.g. ``x: Annotated[int, Field()] = 1``.
+        return (
+            isinstance(node.target, ast.Name)
+            and _is_literal(node.value)
+            and not any(isinstance(sub, ast.Call) for sub in ast.walk(node.annotation))
+        )
+    return False
+
+
+_PARSE_FLAGS = ast.PyCF_ONLY_AST
+
+
+def _parse(source: bytes, filename: str) -> ast.Module:
+    # What ast.parse does, minus its per-call argument handling.
+    return compile(source, filename, "exec", _PARSE_FLAGS, dont_inherit=True)
+
+
+class _ParseCache:
+    """Persistent store of parsed modules keyed by source hash + interpreter.
+
+    Pickled ``ast.Module`` objects live in ``cache_dir/<hash>.pkl``; a JSON
+    manifest maps relative paths to their current hash so entries orphaned by
+    edits can be garbage collected once indexing finishes. The cache is only
+    an accelerator: any failure to load or store an entry is treated as a
+    miss, never as an indexing error.
+    """
+
+    _MANIFEST = "manifest.json"
+
+    def __init__(self, cache_dir: Path):
+        self.cache_dir = cache_dir
+
+    @staticmethod
+    def key(source: bytes) -> str:
+        digest = hashlib.sha256(sys.version.encode())
+        digest.update(source)
+        return digest.hexdigest()
+
+    def parse(self, key: str, source: bytes, filename: str) -> ast.Module:
+        path = self.cache_dir / f"{key}.pkl"
+        try:
+            with path.open("rb") as fh:
+                cached = pickle.load(fh)
+            if isinstance(cached, ast.Module):
+                return cached
+        except Exception:
+            # Truncated, corrupt or incompatible entries all just miss.
+            pass
+        tree = _parse(source, filename)
+        tmp = path.with_name(f"{key}.{os.getpid()}.tmp")
+        try:
+            with tmp.open("wb") as fh:
+                pickle.dump(tree, fh, protocol=pickle.HIGHEST_PROTOCOL)
+            tmp.replace(path)
+        except Exception:
+            # E.g. a read-only or full cache dir, or a tree too deep to pickle.
+            try:
+                tmp.unlink(missing_ok=True)
+            except OSError:
+                pass
+        return tree
+
+    def flush(self, current: Mapping[str, str]) -> None:
+        """Persist *current* (path -> key) and drop entries no longer referenced."""
+
+        manifest = self.cache_dir / self._MANIFEST
+        try:
+            previous: Dict[str, str] = json.loads(manifest.read_text())
+        except (OSError, ValueError):
+            previous = {}
         try:
-            tree = ast.parse(text)
-        except SyntaxError:
-            continue
+            for key in set(previous.values()) - set(current.values()):
+                (self.cache_dir / f"{key}.pkl").unlink(missing_ok=True)
+            manifest.write_text(json.dumps(dict(current), sort_keys=True))
+        except OSError:
+            pass
 
-        for node in ast.walk(tree):
+
+_FileIndex = Tuple[List[_SpanRow], List[_SpanRow], bytes, Optional[str]]
+
+
+def _index_one(root: str, rel: str, cache_dir: str | None) -> _FileIndex:
+    """Parse and index a single file; runs in worker processes."""
+
+    data = (Path(root) / rel).read_bytes()
+    symbols: List[_SpanRow] = []
+    calls: List[_SpanRow] = []
+    key = None
+    try:
+        if cache_dir is not None:
+            cache = _ParseCache(Path(cache_dir))
+            key = cache.key(data)
+            tree = cache.parse(key, data, rel)
+        else:
+            tree = _parse(data, rel)
+    except SyntaxError:
+        return symbols, calls, data, key
+    if all(_is_trivial_stmt(node) for node in tree.body):
+        # Nothing to index (e.g. re-export __init__ modules); skip the walk.
+        return symbols, calls, data, key
+    if _is_vendored(rel):
+        # Shallow index: top-level definitions only, no bodies, no call-sites.
+        for node in tree.body:
             if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
-                span = types.AstSpan(
-                    file=rel,
-                    start_line=node.lineno,
-                    end_line=getattr(node, "end_lineno", node.lineno),
-                    node_type="FunctionDef",
-                    symbol=node.name,
-                )
-                symbol_map.setdefault(node.name, []).append(span)
+                symbols.append((node.name, node.lineno, getattr(node, "end_lineno", node.lineno), "FunctionDef"))
             elif isinstance(node, ast.ClassDef):
-                span = types.AstSpan(
-                    file=rel,
-                    start_line=node.lineno,
-                    end_line=getattr(node, "end_lineno", node.lineno),
-                    node_type="ClassDef",
-                    symbol=node.name,
-                )
-                symbol_map.setdefault(node.name, []).append(span)
+                symbols.append((node.name, node.lineno, getattr(node, "end_lineno", node.lineno), "ClassDef"))
+    else:
+        _IndexVisitor(symbols, calls).visit(tree)
+    return symbols, calls, data, key
+
+
+class _SpanTable:
+    """Hash-conses spans so equal spans share one instance and interned strings."""
+
+    def __init__(self) -> None:
+        self._spans: Dict[Tuple[str, int, int, str, str], types.AstSpan] = {}
+
+    def span(self, file: str, row: _SpanRow) -> types.AstSpan:
+        symbol, start, end, node_type = row
+        key = (file, start, end, node_type, symbol)
+        span = self._spans.get(key)
+        if span is None:
+            span = self._spans[key] = types.AstSpan(
+                file=file,
+                start_line=start,
+                end_line=end,
+                node_type=sys.intern(node_type),
+                symbol=sys.intern(symbol),
+            )
+        return span
 
-        visitor = _CallVisitor(rel, call_map)
-        visitor.visit(tree)
 
-    return AstIndex(root=root, _symbols=symbol_map, _calls=call_map, _file_cache=file_cache)
+# Per resolved root, the last index built and the (path, mtime, size) stamp of
+# every file it read; bounded so long-lived processes do not pin old trees.
+_INDEX_CACHE: Dict[str, Tuple[Tuple[Tuple[str, int, int], ...], AstIndex]] = {}
+_INDEX_CACHE_SIZE = 32
+
+
+def _fingerprint(root: Path, rels: List[str]) -> Tuple[Tuple[str, int, int], ...] | None:
+    """Stamp *rels* for reuse, or None if any file is too fresh to trust."""
+
+    stamps = []
+    racy_after = time.time_ns() - _fs.RACY_MTIME_NS
+    for rel in rels:
+        try:
+            st = os.stat(root / rel)
+        except OSError:
+            return None
+        if st.st_mtime_ns > racy_after:
+            return None
+        stamps.append((rel, st.st_mtime_ns, st.st_size))
+    return tuple(stamps)
+
+
+def _detached(index: AstIndex) -> AstIndex:
+    # Spans are immutable and shared; the source cache is per caller so
+    # refresh() on one copy never leaks into another.
+    return AstIndex(
+        root=index.root,
+        _symbols=index._symbols,
+        _calls=index._calls,
+        _file_cache=dict(index._file_cache),
+    )
+
+
+def build_index(
+    repo_path: Path | str,
+    *,
+    cache_dir: Path | str | None = None,
+    max_workers: int | None = None,
+    force: bool = False,
+) -> AstIndex:
+    """Build an :class:`AstIndex` for the given repository.
+
+    When *cache_dir* is given, parsed modules are persisted there and reused on
+    later runs for files whose contents are unchanged. Large repositories are
+    parsed in a process pool of up to *max_workers* (defaults to the CPU count),
+    with at least ``_fs.PARALLEL_MIN_FILES`` files per worker; pass
+    ``max_workers=1`` to index in-process.
+
+    Within a process, rebuilding a tree whose Python files all keep their
+    mtime and size returns a copy of the previous index; ``force=True``
+    always re-indexes.
+    """
+
+    root = Path(repo_path)
+    cache_path = Path(cache_dir) if cache_dir is not None else None
+    if cache_path is not None:
+        try:
+            cache_path.mkdir(parents=True, exist_ok=True)
+        except OSError:
+            # An unusable cache dir only costs speed: index without it.
+            cache_path = None
+    cache_str = str(cache_path) if cache_path is not None else None
+    rels = _list_python_files(root, cache_path)
+    root_key = str(root.resolve())
+    fingerprint = _fingerprint(root, rels)
+    cached = _INDEX_CACHE.get(root_key)
+    if not force and fingerprint is not None and cached is not None and cached[0] == fingerprint:
+        return _detached(cached[1])
+    # Like gates._compile_all: at least PARALLEL_MIN_FILES files per worker,
+    # so small trees are not slowed down by a pool sized to the host.
+    workers = min(max_workers or os.cpu_count() or 1, len(rels) // _fs.PARALLEL_MIN_FILES)
+
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            chunksize = max(1, len(rels) // (workers * 4))
+            results = list(
+                pool.map(_index_one, repeat(str(root)), rels, repeat(cache_str), chunksize=chunksize)
+            )
+    else:
+        results = [_index_one(str(root), rel, cache_str) for rel in rels]
+
+    symbol_map: Dict[str, List[types.AstSpan]] = {}
+    call_map: Dict[str, List[types.AstSpan]] = {}
+    file_cache: Dict[str, bytes] = {}
+    cache_keys: Dict[str, str] = {}
+    table = _SpanTable()
+    for rel, (symbols, calls, data, key) in zip(rels, results):
+        file_cache[rel] = data
+        for row in symbols:
+            symbol_map.setdefault(row[0], []).append(table.span(rel, row))
+        for row in calls:
+            call_map.setdefault(row[0], []).append(table.span(rel, row))
+        if key is not None:
+            cache_keys[rel] = key
 
+    if cache_path is not None:
+        _ParseCache(cache_path).flush(cache_keys)
+    # Freeze the lists so lookups can hand out the stored tuples without copying.
+    index = AstIndex(
+        root=root,
+        _symbols={name: tuple(spans) for name, spans in symbol_map.items()},
+        _calls={name: tuple(spans) for name, spans in call_map.items()},
+        _file_cache=file_cache,
+    )
+    _INDEX_CACHE.pop(root_key, None)
+    if fingerprint is not None:
+        if len(_INDEX_CACHE) >= _INDEX_CACHE_SIZE:
+            del _INDEX_CACHE[next(iter(_INDEX_CACHE))]
+        _INDEX_CACHE[root_key] = (fingerprint, _detached(index))
+    return index
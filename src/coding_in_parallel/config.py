@@ -4,13 +4,23 @@ from __future__ import annotations
 
 from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Callable, Dict
 
 import yaml
 
+# libyaml-backed loader when available; falls back to the pure-Python parser.
+_YamlLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
 
-def _filter_kwargs(data: Dict[str, Any], *, allowed: set[str]) -> Dict[str, Any]:
-    return {key: value for key, value in data.items() if key in allowed}
+
+def _make_filter(cls: type) -> Callable[[Dict[str, Any]], Dict[str, Any]]:
+    """Return a filter keeping only *cls*'s fields, specialised once per dataclass."""
+
+    keys = tuple(cls.__annotations__)
+
+    def _filter(data: Dict[str, Any]) -> Dict[str, Any]:
+        return {key: data[key] for key in keys if key in data}
+
+    return _filter
 
 
 @dataclass(frozen=True)
@@ -19,6 +29,9 @@ class ModelConfig:
     name: str | None = None
 
 
+_MODEL_FILTER = _make_filter(ModelConfig)
+
+
 @dataclass(frozen=True)
 class SearchConfig:
     max_steps: int = 4
@@ -29,6 +42,9 @@ class SearchConfig:
     use_landmarks: bool = False
 
 
+_SEARCH_FILTER = _make_filter(SearchConfig)
+
+
 @dataclass(frozen=True)
 class LimitsConfig:
     max_loc_changes: int = 12
@@ -36,10 +52,21 @@ class LimitsConfig:
     slice_padding_lines: int = 80
 
 
+_LIMITS_FILTER = _make_filter(LimitsConfig)
+
+
 @dataclass(frozen=True)
 class TnrConfig:
     actions_per_txn: int = 3
     require_mu_nonworsening: bool = True
+    # >1 evaluates proposals concurrently in that many temporary git worktrees.
+    # Worktrees hold tracked files only and editable installs still import
+    # from the primary checkout, so a targeted-tests pass there is not proof
+    # for the primary tree; only the static gate is re-run before committing.
+    parallel_attempts: int = 1
+
+
+_TNR_FILTER = _make_filter(TnrConfig)
 
 
 @dataclass(frozen=True)
@@ -49,10 +76,17 @@ class GateConfig:
     smoke: bool = False
 
 
+_GATE_FILTER = _make_filter(GateConfig)
+
+
 @dataclass(frozen=True)
 class LoggingConfig:
     dir: str = ".agent_runs"
     stream: bool = False
+    artifacts: bool = True
+
+
+_LOGGING_FILTER = _make_filter(LoggingConfig)
 
 
 @dataclass(frozen=True)
@@ -72,14 +106,12 @@ class Config:
 
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> "Config":
-        search = SearchConfig(**_filter_kwargs(data.get("search", {}), allowed=set(SearchConfig.__annotations__.keys())))
-        limits = LimitsConfig(**_filter_kwargs(data.get("limits", {}), allowed=set(LimitsConfig.__annotations__.keys())))
-        tnr_cfg = TnrConfig(**_filter_kwargs(data.get("tnr", {}), allowed=set(TnrConfig.__annotations__.keys())))
-        gates = GateConfig(**_filter_kwargs(data.get("gates", {}), allowed=set(GateConfig.__annotations__.keys())))
-        logging_cfg = LoggingConfig(
-            **_filter_kwargs(data.get("logging", {}), allowed=set(LoggingConfig.__annotations__.keys()))
-        )
-        model_cfg = ModelConfig(**_filter_kwargs(data.get("model", {}), allowed=set(ModelConfig.__annotations__.keys())))
+        search = SearchConfig(**_SEARCH_FILTER(data.get("search", {})))
+        limits = LimitsConfig(**_LIMITS_FILTER(data.get("limits", {})))
+        tnr_cfg = TnrConfig(**_TNR_FILTER(data.get("tnr", {})))
+        gates = GateConfig(**_GATE_FILTER(data.get("gates", {})))
+        logging_cfg = LoggingConfig(**_LOGGING_FILTER(data.get("logging", {})))
+        model_cfg = ModelConfig(**_MODEL_FILTER(data.get("model", {})))
         return cls(
             model=model_cfg,
             search=search,
@@ -99,7 +131,8 @@ class Config:
             path = Path(path)
         if not path.exists():
             return cls.default()
-        raw = yaml.safe_load(path.read_text()) or {}
+        with path.open("r", encoding="utf-8") as fh:
+            raw = yaml.load(fh, Loader=_YamlLoader) or {}
         if not isinstance(raw, dict):
             raise ValueError("Config file must contain a mapping at the top level.")
         return cls.from_dict(raw)
@@ -2,40 +2,132 @@
 
 from __future__ import annotations
 
+import functools
+import os
 import shlex
 import subprocess
 import sys
-from pathlib import Path
-from typing import Tuple
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple
+
+from . import _fs
+
+# Per repo, files that last compiled cleanly: path -> (st_mtime_ns, st_size).
+_COMPILED: Dict[str, Dict[str, Tuple[int, int]]] = {}
+
+
+def _py_compile(py_files: List[str], repo_path: str) -> subprocess.CompletedProcess[bytes]:
+    cmd = [sys.executable, "-m", "py_compile", *py_files]
+    return subprocess.run(cmd, cwd=repo_path, capture_output=True)
+
+
+def _compile_in_process(py_files: List[str]) -> Tuple[bool, str]:
+    # Mirrors ``python -m py_compile`` (stop at the first error and report it)
+    # but only compiles: no bytecode is written into the repo under test.
+    for path in py_files:
+        try:
+            with open(path, "rb") as fh:
+                source = fh.read()
+            compile(source, path, "exec", dont_inherit=True)
+        except (SyntaxError, ValueError) as exc:
+            return False, "".join(traceback.format_exception_only(type(exc), exc))
+        except OSError as exc:
+            return False, str(exc)
+    return True, ""
+
+
+def _failure_output(*procs: subprocess.CompletedProcess[bytes]) -> str:
+    # Output is only surfaced for failed gates, so it is decoded only then.
+    return b"".join(proc.stdout + proc.stderr for proc in procs).decode("utf-8", "replace")
+
+
+def _compile_all(py_files: List[str], repo_path: str) -> Tuple[bool, str]:
+    if len(py_files) < _fs.PARALLEL_MIN_FILES:
+        # Incremental checks usually see one or two edited files.
+        return _compile_in_process(py_files)
+    workers = min(os.cpu_count() or 1, len(py_files) // _fs.PARALLEL_MIN_FILES)
+    if workers <= 1:
+        proc = _py_compile(py_files, repo_path)
+        if proc.returncode == 0:
+            return True, ""
+        return False, _failure_output(proc)
+    # Each shard is its own interpreter, so threads only wait on children.
+    shards = [py_files[i::workers] for i in range(workers)]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        procs = list(pool.map(_py_compile, shards, [repo_path] * workers))
+    if all(proc.returncode == 0 for proc in procs):
+        return True, ""
+    return False, _failure_output(*procs)
+
+
+def forget(repo_path: str) -> None:
+    """Drop what :func:`run_static_checks` remembers about ``repo_path``.
+
+    Call this when the tree is deleted, e.g. a temporary worktree.
+    """
+
+    _COMPILED.pop(os.path.realpath(repo_path), None)
 
 
 def run_static_checks(repo_path: str) -> Tuple[bool, str]:
-    """Run lightweight static checks using ``py_compile``."""
+    """Run lightweight static checks using ``py_compile``.
 
-    root = Path(repo_path)
-    py_files = [str(path) for path in root.rglob("*.py") if path.is_file()]
-    if not py_files:
+    Files whose mtime and size are unchanged since they last compiled
+    cleanly in this process are skipped. Compiler output is returned only
+    on failure.
+    """
+
+    compiled = _COMPILED.setdefault(os.path.realpath(repo_path), {})
+    now_ns = time.time_ns()
+    found = False
+    py_files: List[str] = []
+    settled: Dict[str, Tuple[int, int]] = {}
+    for entry in _fs.walk_python_files(repo_path):
+        found = True
+        try:
+            st = entry.stat()
+        except OSError:
+            py_files.append(entry.path)
+            continue
+        signature = (st.st_mtime_ns, st.st_size)
+        if compiled.get(entry.path) == signature:
+            continue
+        py_files.append(entry.path)
+        if now_ns - st.st_mtime_ns > _fs.RACY_MTIME_NS:
+            settled[entry.path] = signature
+    if not found:
         return True, "no python files"
-    cmd = [sys.executable, "-m", "py_compile", *py_files]
-    proc = subprocess.run(cmd, cwd=repo_path, capture_output=True, text=True)
-    success = proc.returncode == 0
-    output = proc.stdout + proc.stderr
+    if not py_files:
+        return True, "no changes"
+    success, output = _compile_all(py_files, repo_path)
+    if success:
+        compiled.update(settled)
     return success, output
 
 
+@functools.lru_cache(maxsize=64)
+def _split(cmd: str) -> Tuple[str, ...]:
+    # The same test command is re-run for every transaction and probe.
+    return tuple(shlex.split(cmd))
+
+
 def run_targeted_tests(test_cmd: str, repo_path: str) -> Tuple[bool, str]:
-    """Run the provided targeted test command."""
+    """Run the provided targeted test command.
+
+    Output is returned only when the command fails; success yields ``""``.
+    """
 
     if not test_cmd:
         return True, "no tests configured"
     proc = subprocess.run(
-        shlex.split(test_cmd),
+        _split(test_cmd),
         cwd=repo_path,
         capture_output=True,
-        text=True,
     )
-    success = proc.returncode == 0
-    output = proc.stdout + proc.stderr
-    return success, output
+    if proc.returncode == 0:
+        return True, ""
+    return False, _failure_output(proc)
 
 
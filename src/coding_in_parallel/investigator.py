@@ -2,40 +2,53 @@
 
 from __future__ import annotations
 
-import json
-from dataclasses import replace
-from pathlib import Path
+import functools
+import heapq
+import os
+from concurrent.futures import Future, ThreadPoolExecutor
 from typing import Iterable, List, Sequence
 
-from . import ast_index, llm, types
+from . import _json, ast_index, llm, types
 from .probes import blackboard as bbmod
 from .probes import runner as probe_runner
 from .probes import sandbox as sbx
 from .probes import scheduler as sched
+from .prompting import PROMPT_DIR, PromptTemplate
 
-_PROMPT_DIR = Path(__file__).resolve().parents[2] / "prompts"
+# Default cap on in-flight probe LLM calls; CIP_LLM_CONCURRENCY overrides it
+# to respect provider rate limits (1 restores sequential calls).
+_LLM_CONCURRENCY = 8
 
 
-def _load_prompt(name: str) -> str:
-    path = _PROMPT_DIR / name
+def _llm_concurrency() -> int:
+    try:
+        return max(1, int(os.environ.get("CIP_LLM_CONCURRENCY", _LLM_CONCURRENCY)))
+    except ValueError:
+        return _LLM_CONCURRENCY
+
+
+@functools.lru_cache(maxsize=None)
+def _load_prompt(name: str) -> PromptTemplate:
+    path = PROMPT_DIR / name
     if not path.exists():
         raise FileNotFoundError(f"Prompt {name} not found at {path}")
-    return path.read_text().strip()
+    return PromptTemplate(path.read_text().strip())
 
 
 def recall_candidates(ctx: types.TaskContext) -> List[types.Candidate]:
     """Use the recall prompt to fetch candidate spans."""
 
     prompt = _load_prompt("ast_recall.txt")
-    _ = ast_index.build_index(ctx.repo_path)
+    _ = ctx.ast_index if ctx.ast_index is not None else ast_index.build_index(ctx.repo_path)
     payload = {
         "instance_id": ctx.instance_id,
         "failing_tests": ctx.failing_tests,
     }
     response = llm.complete(prompt.format(**payload))
     try:
-        parsed = json.loads(response or "{}")
-    except json.JSONDecodeError as exc:  # pragma: no cover - guard rails
+        # str or UTF-8 bytes; orjson decodes either without a round-trip
+        parsed = _json.loads(response or "{}")
+    except _json.JSONDecodeError as exc:  # pragma: no cover - guard rails
         raise ValueError(f"Investigator returned non-JSON output: {exc}") from exc
     if isinstance(parsed, list):
         raw_candidates = parsed
@@ -46,17 +59,11 @@ def recall_candidates(ctx: types.TaskContext) -> List[types.Candidate]:
     if not isinstance(raw_candidates, list):
         raise ValueError("'candidates' must be a JSON array.")
     candidates: List[types.Candidate] = []
-    for raw in raw_candidates:
-        if not isinstance(raw, dict):
-            raise ValueError("Each candidate must be a JSON object.")
-        raw_spans = raw.get("spans", [])
-        if not isinstance(raw_spans, list):
-            raise ValueError("Candidate 'spans' must be a list.")
-        spans = []
-        for span in raw_spans:
-            if not isinstance(span, dict):
-                raise ValueError("Each span must be a JSON object.")
-            spans.append(
+    # Trust the shape and let malformed items fail construction instead of
+    # type-checking every candidate and span up front.
+    try:
+        for raw in raw_candidates:
+            spans = [
                 types.AstSpan(
                     file=span["file"],
                     start_line=span["start_line"],
@@ -65,15 +72,21 @@ def recall_candidates(ctx: types.TaskContext) -> List[types.Candidate]:
                     symbol=span.get("symbol"),
                     score=span.get("score"),
                 )
+                for span in raw.get("spans", [])
+            ]
+            candidates.append(
+                types.Candidate(
+                    id=raw.get("id", f"cand-{len(candidates)+1}"),
+                    hypothesis=raw.get("hypothesis", ""),
+                    spans=spans,
+                    evidence=raw.get("evidence", {}),
+                )
             )
-        candidates.append(
-            types.Candidate(
-                id=raw.get("id", f"cand-{len(candidates)+1}"),
-                hypothesis=raw.get("hypothesis", ""),
-                spans=spans,
-                evidence=raw.get("evidence", {}),
-            )
-        )
+    except (AttributeError, KeyError, TypeError) as exc:
+        raise ValueError(
+            f"Malformed recall candidate #{len(candidates) + 1}: expected objects with 'spans' "
+            f"of {{file, start_line, end_line, node_type}} objects ({exc!r})"
+        ) from exc
     return candidates
 
 
@@ -81,15 +94,25 @@ def probe(ctx: types.TaskContext, candidates: Iterable[types.Candidate]) -> List
     """Run probe prompt per candidate and attach the response."""
 
     prompt_template = _load_prompt("probe.txt")
-    enriched: List[types.Candidate] = []
+    candidates = list(candidates)
+    prompts = []
     for candidate in candidates:
         payload = {
             "instance_id": ctx.instance_id,
             "candidate_id": candidate.id,
             "hypothesis": candidate.hypothesis,
         }
-        response = llm.complete(prompt_template.format(**payload))
-        notes = json.loads(response or "{}")
+        prompts.append(prompt_template.format(**payload))
+    # Calls are independent and IO-bound, so overlap them on threads.
+    workers = min(_llm_concurrency(), len(prompts))
+    if workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            responses = list(pool.map(llm.complete, prompts))
+    else:
+        responses = [llm.complete(prompt) for prompt in prompts]
+    enriched: List[types.Candidate] = []
+    for candidate, response in zip(candidates, responses):
+        notes = _json.loads(response or "{}")
         candidate.evidence.setdefault("probe", notes)
         enriched.append(candidate)
     return enriched
@@ -99,32 +122,26 @@ def probe(ctx: types.TaskContext, candidates: Iterable[types.Candidate]) -> List
 
 
 def _candidates_to_suspects(candidates: Sequence[types.Candidate], k: int = 7) -> List[types.Node]:
-    suspects: List[types.Node] = []
-    for cand in candidates:
-        for span in cand.spans:
-            suspicion = span.score if span.score is not None else 0.5
-            suspects.append(
-                types.Node(
-                    id=f"{cand.id}:{span.file}:{span.start_line}-{span.end_line}",
-                    span=span,
-                    kind=span.node_type.lower(),
-                    hop=0,
-                    in_stack=False,
-                    suspicion=float(suspicion),
-                )
-            )
-    # Keep top-k by suspicion
-    suspects.sort(key=lambda n: n.suspicion, reverse=True)
-    return suspects[:k]
+    suspects = [
+        types.Node(
+            id=f"{cand.id}:{span.file}:{span.start_line}-{span.end_line}",
+            span=span,
+            kind=span.node_type.lower(),
+            hop=0,
+            in_stack=False,
+            suspicion=float(span.score) if span.score is not None else 0.5,
+        )
+        for cand in candidates
+        for span in cand.spans
+    ]
+    # Keep top-k by suspicion (same order as a stable descending sort)
+    return heapq.nlargest(k, suspects, key=lambda n: n.suspicion)
 
 
 def _make_probe_patch(pcb: sched.PCB, node: types.Node) -> types.ProbePatch:
     # Minimal, safe instrumentation: add a marker comment at top of target file
-    diff = (
-        f"diff --git a/{node.span.file} b/{node.span.file}\n"\
-        f"@@\n"\
-        f"+# cip_probe {pcb.id} for {node.id}\n"
-    )
+    path = node.span.file
+    diff = f"diff --git a/{path} b/{path}\n@@\n+# cip_probe {pcb.id} for {node.id}\n"
     return types.ProbePatch(
         id=f"pp-{pcb.id}",
         suspect_id=node.id,
@@ -135,6 +152,10 @@ def _make_probe_patch(pcb: sched.PCB, node: types.Node) -> types.ProbePatch:
     )
 
 
+def _cleanup_prefetched(future: Future) -> None:
+    future.result().cleanup()
+
+
 def run_investigations(
     ctx: types.TaskContext,
     candidates: Sequence[types.Candidate],
@@ -159,30 +180,47 @@ def run_investigations(
         schedr.add_pcb(sched.PCB(id=f"pcb-{i+1}", suspect_id=n.id, quantum_ops=quantum_ops, time_budget=timeout_sec))
 
     probes_run = 0
-    while probes_run < max_probes:
-        pcb = schedr.next_pcb()
-        if pcb is None:
-            break
-        node = node_by_id.get(pcb.suspect_id)
-        if node is None:
-            break
-        patch = _make_probe_patch(pcb, node)
-        sb = sbx.create(ctx.repo_path)
+    cleanups: List[Future] = []
+    # Sandboxes are interchangeable copies of the repo, so the next one is
+    # created (and the last one removed) in the background while a probe runs.
+    # The first is created on demand, once there is a PCB to run in it.
+    with ThreadPoolExecutor(max_workers=1) as prefetch:
+        next_sb: Future | None = None
         try:
-            artifacts, gain = probe_runner.investigative_tx(sb, [patch], ctx.test_cmd, timeout_sec=timeout_sec)
-            # Update blackboard
-            store.publish_probe_patch(patch)
-            for art in artifacts:
-                store.publish_evidence({"probe_id": art.get("probe_id"), "result": art.get("result")})
-            schedr.record_gain(pcb.id, gain)
-            probes_run += 1
-            # Preemption policy: demote if low gain, boost otherwise
-            if gain <= 0.0:
-                schedr.preempt(pcb.id)
-            else:
-                schedr.boost(pcb.id)
+            while probes_run < max_probes:
+                pcb = schedr.next_pcb()
+                if pcb is None:
+                    break
+                node = node_by_id.get(pcb.suspect_id)
+                if node is None:
+                    break
+                patch = _make_probe_patch(pcb, node)
+                sb = next_sb.result() if next_sb is not None else sbx.create(ctx.repo_path)
+                next_sb = None
+                if probes_run + 1 < max_probes:
+                    next_sb = prefetch.submit(sbx.create, ctx.repo_path)
+                try:
+                    artifacts, gain = probe_runner.investigative_tx(sb, [patch], ctx.test_cmd, timeout_sec=timeout_sec)
+                    # Update blackboard
+                    store.publish_probe_patch(patch)
+                    for art in artifacts:
+                        store.publish_evidence({"probe_id": art.get("probe_id"), "result": art.get("result")})
+                    schedr.record_gain(pcb.id, gain)
+                    probes_run += 1
+                    # Preemption policy: demote if low gain, boost otherwise
+                    if gain <= 0.0:
+                        schedr.preempt(pcb.id)
+                    else:
+                        schedr.boost(pcb.id)
+                finally:
+                    cleanups.append(prefetch.submit(sb.cleanup))
         finally:
-            sb.cleanup()
+            if next_sb is not None:
+                # Prefetched but never used
+                cleanups.append(prefetch.submit(_cleanup_prefetched, next_sb))
+    # Surface cleanup failures now that every sandbox has been released.
+    for cleanup in cleanups:
+        cleanup.result()
 
     return store.snapshot()
 
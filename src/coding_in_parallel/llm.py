@@ -2,6 +2,11 @@
 
 from __future__ import annotations
 
+import hashlib
+import os
+import sqlite3
+import threading
+from pathlib import Path
 from typing import Any, Protocol
 
 
@@ -19,6 +24,16 @@ class _DefaultClient:
 
 _client: SupportsComplete = _DefaultClient()
 
+# Opt-in response cache (CIP_LLM_CACHE=1) for repeated identical prompts.
+_CACHE_DEFAULT_PATH = Path(".agent_runs") / "llm-cache.sqlite"
+_cache_lock = threading.Lock()
+_cache_conn: sqlite3.Connection | None = None
+_cache_path: Path | None = None
+
+
+def _truthy(val: str | None) -> bool:
+    return (val or "").strip().lower() in {"1", "true", "yes", "on", "enable", "enabled"}
+
 
 def set_client(client: SupportsComplete) -> None:
     """Register a global client used by :func:`complete`."""
@@ -27,9 +42,63 @@ def set_client(client: SupportsComplete) -> None:
     _client = client
 
 
-def complete(prompt: str, **kwargs: Any) -> str:
-    """Delegate to the configured LLM client."""
-
-    return _client.complete(prompt, **kwargs)
+def _client_identity(client: SupportsComplete) -> str:
+    # Clients of one class may target different models or sampling settings;
+    # they distinguish themselves with a ``cache_key`` (or at least ``model``).
+    cls = type(client)
+    identity = getattr(client, "cache_key", None) or getattr(client, "model", None)
+    return f"{cls.__module__}.{cls.__qualname__}:{identity!r}"
+
+
+def _cache_key(prompt: str, kwargs: dict[str, Any]) -> str:
+    digest = hashlib.blake2b(digest_size=32)
+    digest.update(_client_identity(_client).encode("utf-8") + b"\0")
+    digest.update(prompt.encode("utf-8") + b"\0")
+    digest.update(repr(sorted(kwargs.items())).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _cache_connection() -> sqlite3.Connection:
+    """Return the shared cache connection; callers must hold ``_cache_lock``."""
+
+    global _cache_conn, _cache_path
+    path = Path(os.environ.get("CIP_LLM_CACHE_PATH") or _CACHE_DEFAULT_PATH)
+    if _cache_conn is None or path != _cache_path:
+        if _cache_conn is not None:
+            _cache_conn.close()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, response TEXT NOT NULL)")
+        _cache_conn, _cache_path = conn, path
+    return _cache_conn
+
+
+def complete(prompt: str, *, cache: bool = True, **kwargs: Any) -> str:
+    """Delegate to the configured LLM client.
+
+    With ``CIP_LLM_CACHE=1`` responses are memoised in SQLite (path from
+    ``CIP_LLM_CACHE_PATH``) keyed on the client's class and ``cache_key`` or
+    ``model`` attribute, the prompt and kwargs. Pass ``cache=False`` when a
+    fresh answer to an already-sent prompt is wanted, e.g. on a retry; the
+    response still replaces the cached one.
+    """
+
+    if not _truthy(os.environ.get("CIP_LLM_CACHE")):
+        return _client.complete(prompt, **kwargs)
+    key = _cache_key(prompt, kwargs)
+    if cache:
+        with _cache_lock:
+            row = _cache_connection().execute("SELECT response FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is not None:
+            return row[0]
+    # The provider call runs unlocked so concurrent callers still overlap.
+    response = _client.complete(prompt, **kwargs)
+    if isinstance(response, str):
+        with _cache_lock:
+            _cache_connection().execute(
+                "INSERT OR REPLACE INTO cache (key, response) VALUES (?, ?)", (key, response)
+            )
+    return response
 
 
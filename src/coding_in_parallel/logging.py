@@ -5,23 +5,51 @@ Adds both artifact persistence and lightweight streaming of events.
 
 from __future__ import annotations
 
-import json
+import math
 import os
 import sys
 import time
-from datetime import datetime
+import weakref
 from pathlib import Path
 from typing import Any
 
+from . import _json
+
+# Buffered events are pushed to disk at least this often (and on close()).
+_EVENTS_FLUSH_EVERY = 64
+# (epoch second, formatted "YYYY-MM-DDTHH:MM:SS") for the last event stamped;
+# one tuple so concurrent loggers never pair a second with another's prefix.
+_iso_second: tuple[int, str] = (-1, "")
+
 
 def _truthy(val: str | None) -> bool:
     return (val or "").strip().lower() in {"1", "true", "yes", "on", "enable", "enabled"}
 
 
+def _iso_utc(ts: float) -> str:
+    """Millisecond ISO-8601 UTC stamp, formatting each second only once."""
+    global _iso_second
+    # Round the fraction to microseconds first, as datetime.fromtimestamp does.
+    frac, whole = math.modf(ts)
+    second, micros = divmod(int(whole) * 1_000_000 + round(frac * 1_000_000), 1_000_000)
+    cached_second, prefix = _iso_second
+    if second != cached_second:
+        prefix = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(second))
+        _iso_second = (second, prefix)
+    return f"{prefix}.{micros // 1000:03d}Z"
+
+
 class RunLogger:
     """Persist structured artefacts for a single agent run."""
 
-    def __init__(self, base_dir: str | Path = ".agent_runs", run_id: str | None = None, *, stream: bool | None = None):
+    def __init__(
+        self,
+        base_dir: str | Path = ".agent_runs",
+        run_id: str | None = None,
+        *,
+        stream: bool | None = None,
+        artifacts: bool = True,
+    ):
         self.base_dir = Path(base_dir)
         self.base_dir.mkdir(parents=True, exist_ok=True)
         if run_id is None:
@@ -33,13 +61,21 @@ class RunLogger:
             stream = _truthy(os.environ.get("CIP_LOG_STREAM"))
         self._stream = bool(stream)
         self._events_path = self.run_dir / "events.ndjson"
+        self._events_fh = self._events_path.open("ab", buffering=1 << 16)
+        self._pending_events = 0
+        # Flush and close on garbage collection or interpreter exit.
+        self._finalizer = weakref.finalize(self, self._events_fh.close)
+        # Callers check this before building large artifact payloads.
+        self.json_enabled = bool(artifacts)
 
     def path_for(self, name: str, suffix: str) -> Path:
         return self.run_dir / f"{name}.{suffix}"
 
-    def log_json(self, name: str, data: Any) -> Path:
+    def log_json(self, name: str, data: Any) -> Path | None:
+        if not self.json_enabled:
+            return None
         path = self.path_for(name, "json")
-        path.write_text(json.dumps(data, indent=2, sort_keys=True))
+        path.write_bytes(_json.dumps_bytes(data, indent=True, sort_keys=True))
         self.log_event("file.write", name=name, path=str(path))
         return path
 
@@ -51,15 +87,18 @@ class RunLogger:
 
     def log_event(self, kind: str, /, **data: Any) -> None:
         """Append a structured event to events.ndjson and optionally echo to stdout."""
+        ts = time.time()
         record = {
-            "ts": time.time(),
-            "ts_iso": datetime.utcnow().isoformat(timespec="milliseconds") + "Z",
+            "ts": ts,
+            "ts_iso": _iso_utc(ts),
             "kind": kind,
             "data": data,
         }
-        # Append as one JSON line
-        with self._events_path.open("a", encoding="utf-8") as fh:
-            fh.write(json.dumps(record, separators=(",", ":")) + "\n")
+        # Append as one JSON line to the buffered run-long handle
+        self._events_fh.write(_json.dumps_bytes(record) + b"\n")
+        self._pending_events += 1
+        if self._stream or self._pending_events >= _EVENTS_FLUSH_EVERY:
+            self.flush()
         if self._stream:
             # Compact human-readable echo
             msg = f"[{record['ts_iso']}] {kind} "
@@ -69,3 +108,12 @@ class RunLogger:
                     msg += f"{key}={data[key]} "
             print(msg.strip(), file=sys.stdout, flush=True)
 
+    def flush(self) -> None:
+        """Write buffered events through to events.ndjson."""
+        if not self._events_fh.closed:
+            self._events_fh.flush()
+        self._pending_events = 0
+
+    def close(self) -> None:
+        """Flush and close the events file; further events are an error."""
+        self._finalizer()
@@ -2,21 +2,19 @@
 
 from __future__ import annotations
 
-import json
-from dataclasses import asdict
-from pathlib import Path
+import functools
 from typing import Iterable, List
 
-from . import llm, types
+from . import _json, llm, types
+from .prompting import PROMPT_DIR, PromptTemplate
 
-_PROMPT_DIR = Path(__file__).resolve().parents[2] / "prompts"
 
-
-def _load_prompt(name: str) -> str:
-    path = _PROMPT_DIR / name
+@functools.lru_cache(maxsize=None)
+def _load_prompt(name: str) -> PromptTemplate:
+    path = PROMPT_DIR / name
     if not path.exists():
         raise FileNotFoundError(f"Prompt {name} not found at {path}")
-    return path.read_text().strip()
+    return PromptTemplate(path.read_text().strip())
 
 
 def synthesize(candidates: Iterable[types.Candidate]) -> types.Understanding:
@@ -28,8 +26,8 @@ def synthesize(candidates: Iterable[types.Candidate]) -> types.Understanding:
     }
     response = llm.complete(template.format(**payload))
     try:
-        data = json.loads(response or "{}")
-    except json.JSONDecodeError:
+        data = _json.loads(response or "{}")
+    except _json.JSONDecodeError:
         # Fallback: coerce raw string into a summary
         data = {"summary": (response or "").strip(), "invariants": [], "dependencies": []}
     # Some models may return a list; coerce to dict sensibly
@@ -67,7 +65,7 @@ def plan(understanding: types.Understanding) -> List[types.PlanStep]:
     }
     prompt = template.format(**payload)
     response = llm.complete(prompt)
-    items = json.loads(response or "[]")
+    items = _json.loads(response or "[]")
     steps: List[types.PlanStep] = []
     for raw in items:
         spans = [
@@ -99,32 +97,30 @@ def plan_landmarks(failure: types.FailurePattern, *, max_landmarks: int = 3) ->
 
     template = _load_prompt("plan_landmarks.txt")
     payload = {
-        "failure_pattern": json.dumps(
+        "failure_pattern": _json.dumps(
             {
                 "summary": failure.summary,
-                "primary_location": asdict(failure.primary_location),
+                "primary_location": failure.primary_location,
                 "alternatives": [
-                    {"span": asdict(alt["span"]), "why": alt.get("why", "")} for alt in failure.alternatives
+                    {"span": alt["span"], "why": alt.get("why", "")} for alt in failure.alternatives
                 ],
                 "invariants": failure.invariants,
                 "confidence": failure.confidence,
                 "assumptions_to_check": failure.assumptions_to_check,
                 "temporary_props": failure.temporary_props,
-            },
-            ensure_ascii=False,
-            separators=(",", ":"),
+            }
         ),
         "max_landmarks": max_landmarks,
     }
     response = llm.complete(template.format(**payload))
     try:
-        items = json.loads(response or "[]")
-    except json.JSONDecodeError:
+        items = _json.loads(response or "[]")
+    except _json.JSONDecodeError:
         # Defensive extraction of array body
         start = response.find("[") if response else -1
         end = response.rfind("]") if response else -1
         if start != -1 and end != -1 and end > start:
-            items = json.loads(response[start : end + 1])
+            items = _json.loads(response[start : end + 1])
         else:
             items = []
     lms: List[types.Landmark] = []
@@ -0,0 +1,43 @@
+"""Prompt templates parsed once and rendered without re-scanning the text."""
+
+from __future__ import annotations
+
+import os
+import string
+from pathlib import Path
+from typing import Any, List, Optional, Tuple
+
+# <repo>/prompts, derived with string ops only (no realpath syscalls at import).
+PROMPT_DIR = Path(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))) / "prompts"
+
+
+class PromptTemplate:
+    """A ``str.format``-compatible template split into literals and fields.
+
+    Plain ``{name}`` fields are joined directly at render time; templates
+    using positional fields, conversions, format specs or attribute/index
+    access fall back to ``str.format``.
+    """
+
+    __slots__ = ("text", "_parts")
+
+    def __init__(self, text: str):
+        self.text = text
+        parts: Optional[List[Tuple[str, Optional[str]]]] = []
+        for literal, field, spec, conversion in string.Formatter().parse(text):
+            if field is not None and (spec or conversion or not field.isidentifier()):
+                parts = None
+                break
+            parts.append((literal, field))
+        self._parts = parts
+
+    def format(self, **kwargs: Any) -> str:
+        if self._parts is None:
+            return self.text.format(**kwargs)
+        return "".join(
+            literal if field is None else literal + format(kwargs[field])
+            for literal, field in self._parts
+        )
+
+    def __str__(self) -> str:
+        return self.text
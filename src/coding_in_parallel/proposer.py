@@ -2,29 +2,27 @@
 
 from __future__ import annotations
 
-import json
-from pathlib import Path
+import functools
 from typing import Dict, List
 
-from . import config as config_module, llm, types
+from . import _json, config as config_module, llm, types
+from .prompting import PROMPT_DIR, PromptTemplate
 
-_PROMPT_DIR = Path(__file__).resolve().parents[2] / "prompts"
 
-
-def _load_prompt(name: str) -> str:
-    path = _PROMPT_DIR / name
+@functools.lru_cache(maxsize=None)
+def _load_prompt(name: str) -> PromptTemplate:
+    path = PROMPT_DIR / name
     if not path.exists():
         raise FileNotFoundError(f"Prompt {name} not found at {path}")
-    return path.read_text().strip()
+    return PromptTemplate(path.read_text().strip())
 
 
 def _format_span_summary(step: types.PlanStep) -> str:
-    parts = []
-    for span in step.target_spans:
-        symbol = f" {span.symbol}" if span.symbol else ""
-        parts.append(
-            f"- {span.file}:{span.start_line}-{span.end_line} ({span.node_type}{symbol})"
-        )
+    parts = [
+        f"- {span.file}:{span.start_line}-{span.end_line}"
+        f" ({span.node_type}{' ' + span.symbol if span.symbol else ''})"
+        for span in step.target_spans
+    ]
     return "\n".join(parts) if parts else "- (no target spans provided)"
 
 
@@ -33,8 +31,13 @@ def propose(
     ctx_files: Dict[str, str],
     *,
     config: config_module.Config,
+    cache: bool = True,
 ) -> List[types.DiffProposal]:
-    """Produce up to *k* unified diff proposals for *step*."""
+    """Produce up to *k* unified diff proposals for *step*.
+
+    Retries pass ``cache=False`` so a cached LLM response for the same prompt
+    is not handed back again.
+    """
 
     prompt = _load_prompt("propose_diff.txt")
     context_lines = []
@@ -61,10 +64,10 @@ def propose(
         "line_windows": line_windows,
     }
     formatted_prompt = prompt.format(**payload)
-    response = llm.complete(formatted_prompt)
+    response = llm.complete(formatted_prompt, cache=cache)
     try:
-        items = json.loads(response or "[]")
-    except json.JSONDecodeError as exc:  # pragma: no cover - guard rails
+        items = _json.loads(response or "[]")
+    except _json.JSONDecodeError as exc:  # pragma: no cover - guard rails
         raise ValueError(f"Proposer returned non-JSON output: {exc}") from exc
     if not isinstance(items, list):
         raise ValueError("Proposer output must be a JSON list of proposals.")
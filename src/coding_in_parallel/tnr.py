@@ -2,9 +2,12 @@
 
 from __future__ import annotations
 
-import subprocess
+import os
+import queue
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass, field
-from typing import Iterable, List
+from typing import Dict, Iterable, List, Tuple
 
 from . import config as config_module, gates, types, validate, vcs
 
@@ -18,19 +21,170 @@ class TransactionResult:
     logs: List[str] = field(default_factory=list)
 
 
+def _numstat(repo_path: str, paths: Iterable[str] | None = None) -> Dict[str, int]:
+    """Per-file mu contributions, ``(added + deleted) // 2``, of the working tree."""
+
+    return {
+        path: (added + deleted) // 2
+        for path, (added, deleted) in vcs.numstat(repo_path, paths).items()
+    }
+
+
 def _measure_mu(repo_path: str) -> int:
-    proc = subprocess.run(
-        ["git", "diff", "--numstat"],
-        cwd=repo_path,
-        text=True,
-        capture_output=True,
-    )
-    total = 0
-    for line in proc.stdout.splitlines():
-        parts = line.split()
-        if len(parts) >= 3 and parts[0].isdigit() and parts[1].isdigit():
-            total += (int(parts[0]) + int(parts[1])) // 2
-    return total
+    return sum(_numstat(repo_path).values())
+
+
+def _within_limits(
+    proposal: types.DiffProposal,
+    step: types.PlanStep,
+    allowed_files: frozenset[str],
+    prepared: validate.PreparedSpans,
+    config: config_module.Config,
+    logs: List[str],
+) -> bool:
+    try:
+        validate.ensure_within_limits(
+            proposal.unified_diff,
+            allowed_files=allowed_files,
+            max_loc=config.limits.max_loc_changes,
+            max_files=config.limits.max_files_per_diff,
+            target_spans=step.target_spans,
+            padding_lines=config.limits.slice_padding_lines,
+            allow_api_change=("allow_api" in step.constraints),
+            prepared=prepared,
+        )
+    except validate.ValidationError as exc:
+        logs.append(f"validation failed: {exc}")
+        return False
+    return True
+
+
+def _gate_proposal(
+    ctx: types.TaskContext,
+    repo_path: str,
+    head: str,
+    proposal: types.DiffProposal,
+    *,
+    config: config_module.Config,
+    mu_pre: int,
+    base_counts: Dict[str, int],
+    logs: List[str],
+) -> int | None:
+    """Apply ``proposal`` in ``repo_path`` and run the gates.
+
+    Returns mu_post with the diff left applied when every gate passes;
+    otherwise logs the reason, reverts to ``head`` and returns None.
+    """
+
+    try:
+        vcs.apply_diff(proposal.unified_diff, repo_path)
+    except RuntimeError as exc:
+        logs.append(f"git apply failed: {exc}")
+        vcs.revert(repo_path, head)
+        return None
+
+    mu_candidate = None
+    if not config.gates.targeted_tests:
+        # Only files named in the diff can differ from base_counts, so
+        # re-measure just those instead of diffing the whole tree.
+        touched = validate.touched_files(proposal.unified_diff)
+        mu_candidate = (
+            sum(count for file, count in base_counts.items() if file not in touched)
+            + sum(_numstat(repo_path, touched).values())
+        )
+        if config.tnr.require_mu_nonworsening and mu_candidate > mu_pre:
+            logs.append(f"mu worsened from {mu_pre} to {mu_candidate}; rolling back.")
+            vcs.revert(repo_path, head)
+            return None
+
+    if config.gates.static:
+        ok, output = gates.run_static_checks(repo_path)
+        if not ok:
+            logs.append(f"static checks failed: {output.strip()}")
+            vcs.revert(repo_path, head)
+            return None
+
+    if config.gates.targeted_tests:
+        ok, output = gates.run_targeted_tests(ctx.test_cmd, repo_path)
+        mu_post = 0 if ok else 1
+        if not ok:
+            logs.append(f"targeted tests failed: {output.strip()}")
+            vcs.revert(repo_path, head)
+            return None
+    else:
+        mu_post = mu_candidate if mu_candidate is not None else _measure_mu(repo_path)
+    if config.tnr.require_mu_nonworsening and mu_post > mu_pre:
+        logs.append(f"mu worsened from {mu_pre} to {mu_post}; rolling back.")
+        vcs.revert(repo_path, head)
+        return None
+    return mu_post
+
+
+def _gate_in_worktrees(
+    ctx: types.TaskContext,
+    head: str,
+    proposals: List[types.DiffProposal],
+    *,
+    config: config_module.Config,
+    mu_pre: int,
+    logs: List[str],
+) -> Tuple[types.DiffProposal, int] | None:
+    """Gate ``proposals`` concurrently, each in a clean worktree of ``head``.
+
+    The earliest proposal (in input order) that passes wins, so the outcome
+    matches a sequential run over clean trees; later attempts still queued
+    are cancelled once it is known. Logs are appended in proposal order.
+    """
+
+    workers = min(config.tnr.parallel_attempts, len(proposals))
+    attempt_logs: List[List[str]] = [[] for _ in proposals]
+    winner: Tuple[types.DiffProposal, int] | None = None
+    with tempfile.TemporaryDirectory(prefix="cip-wt-") as tmp:
+        trees: List[str] = []
+        free: queue.SimpleQueue[str] = queue.SimpleQueue()
+        try:
+            for i in range(workers):
+                tree = os.path.join(tmp, f"wt-{i}")
+                vcs.add_worktree(ctx.repo_path, tree, head)
+                trees.append(tree)
+                free.put(tree)
+
+            def attempt(index: int) -> int | None:
+                tree = free.get()
+                try:
+                    mu_post = _gate_proposal(
+                        ctx,
+                        tree,
+                        head,
+                        proposals[index],
+                        config=config,
+                        mu_pre=mu_pre,
+                        base_counts={},
+                        logs=attempt_logs[index],
+                    )
+                    if mu_post is not None:
+                        # The winner is re-applied to the primary repo.
+                        vcs.revert(tree, head)
+                    return mu_post
+                finally:
+                    free.put(tree)
+
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                futures = [pool.submit(attempt, i) for i in range(len(proposals))]
+                for index, future in enumerate(futures):
+                    mu_post = future.result()
+                    if mu_post is not None:
+                        winner = (proposals[index], mu_post)
+                        for pending in futures[index + 1:]:
+                            pending.cancel()
+                        break
+        finally:
+            for tree in trees:
+                vcs.remove_worktree(ctx.repo_path, tree)
+                gates.forget(tree)
+    for entries in attempt_logs:
+        logs.extend(entries)
+    return winner
 
 
 def txn_patch(
@@ -40,12 +194,25 @@ def txn_patch(
     *,
     config: config_module.Config,
 ) -> TransactionResult:
-    """Attempt to apply one of the provided diff proposals as a transaction."""
+    """Attempt to apply one of the provided diff proposals as a transaction.
+
+    With ``tnr.parallel_attempts > 1`` the proposals that pass validation are
+    gated concurrently in temporary worktrees checked out at HEAD. The primary
+    tree is reset to HEAD first, so mu_pre is measured on the same tree as the
+    worktrees, and only the winner is applied to it and committed.
+    """
 
     repo_path = ctx.repo_path
     head = vcs.checkpoint(repo_path)
-    allowed_files = {span.file for span in step.target_spans}
+    allowed_files = frozenset(span.file for span in step.target_spans)
+    # Span lookups are the same for every proposal of this step.
+    prepared = validate.prepare_spans(step.target_spans, config.limits.slice_padding_lines)
     logs: List[str] = []
+    pre_counts: Dict[str, int] = {}
+    parallel = config.tnr.parallel_attempts > 1
+    if parallel:
+        # The worktrees are clean checkouts of HEAD, so measure mu_pre there too.
+        vcs.revert(repo_path, head)
 
     if config.gates.targeted_tests:
         baseline_ok, baseline_output = gates.run_targeted_tests(ctx.test_cmd, repo_path)
@@ -53,65 +220,72 @@ def txn_patch(
             logs.append(f"baseline targeted tests failing: {baseline_output.strip()}")
         mu_pre = 0 if baseline_ok else 1
     else:
-        mu_pre = _measure_mu(repo_path)
+        pre_counts = _numstat(repo_path)
+        mu_pre = sum(pre_counts.values())
 
-    for attempt, proposal in enumerate(proposals, start=1):
-        if attempt > max(1, config.tnr.actions_per_txn):
-            logs.append("Reached transaction action budget; stopping attempts.")
-            break
-        try:
-            validate.ensure_within_limits(
-                proposal.unified_diff,
-                allowed_files=allowed_files,
-                max_loc=config.limits.max_loc_changes,
-                max_files=config.limits.max_files_per_diff,
-                target_spans=step.target_spans,
-                padding_lines=config.limits.slice_padding_lines,
-                allow_api_change=("allow_api" in step.constraints),
+    if parallel:
+        valid: List[types.DiffProposal] = []
+        for attempt, proposal in enumerate(proposals, start=1):
+            if attempt > max(1, config.tnr.actions_per_txn):
+                logs.append("Reached transaction action budget; stopping attempts.")
+                break
+            if _within_limits(proposal, step, allowed_files, prepared, config, logs):
+                valid.append(proposal)
+        winner = None
+        if valid:
+            winner = _gate_in_worktrees(
+                ctx, head, valid, config=config, mu_pre=mu_pre, logs=logs
             )
-        except validate.ValidationError as exc:
-            logs.append(f"validation failed: {exc}")
-            continue
-
+        vcs.revert(repo_path, head)
+        if winner is None:
+            return TransactionResult(False, None, mu_pre, mu_pre, logs=logs)
+        proposal, mu_post = winner
         try:
             vcs.apply_diff(proposal.unified_diff, repo_path)
         except RuntimeError as exc:
             logs.append(f"git apply failed: {exc}")
             vcs.revert(repo_path, head)
-            continue
-
-        mu_candidate = None
-        if not config.gates.targeted_tests:
-            mu_candidate = _measure_mu(repo_path)
-            if config.tnr.require_mu_nonworsening and mu_candidate > mu_pre:
-                logs.append(f"mu worsened from {mu_pre} to {mu_candidate}; rolling back.")
-                vcs.revert(repo_path, head)
-                continue
-
+            return TransactionResult(False, None, mu_pre, mu_pre, logs=logs)
         if config.gates.static:
+            # The worktrees lack untracked build artifacts, and editable
+            # installs resolve to this checkout, so recheck it here. Targeted
+            # tests are not re-run (see TnrConfig.parallel_attempts).
             ok, output = gates.run_static_checks(repo_path)
             if not ok:
-                logs.append(f"static checks failed: {output.strip()}")
+                logs.append(f"static checks failed in primary tree: {output.strip()}")
                 vcs.revert(repo_path, head)
-                continue
+                return TransactionResult(False, None, mu_pre, mu_pre, logs=logs)
+        vcs.commit(repo_path, f"txn:{step.id}")
+        return TransactionResult(True, proposal, mu_pre, mu_post, logs=logs)
 
-        if config.gates.targeted_tests:
-            ok, output = gates.run_targeted_tests(ctx.test_cmd, repo_path)
-            mu_post = 0 if ok else 1
-            if not ok:
-                logs.append(f"targeted tests failed: {output.strip()}")
-                vcs.revert(repo_path, head)
-                continue
-        else:
-            mu_post = mu_candidate if mu_candidate is not None else _measure_mu(repo_path)
-        if config.tnr.require_mu_nonworsening and mu_post > mu_pre:
-            logs.append(f"mu worsened from {mu_pre} to {mu_post}; rolling back.")
-            vcs.revert(repo_path, head)
+    applied_before = False
+    for attempt, proposal in enumerate(proposals, start=1):
+        if attempt > max(1, config.tnr.actions_per_txn):
+            logs.append("Reached transaction action budget; stopping attempts.")
+            break
+        if not _within_limits(proposal, step, allowed_files, prepared, config, logs):
+            continue
+
+        # A failed earlier attempt was rolled back to a clean tree.
+        base_counts = {} if applied_before else pre_counts
+        applied_before = True
+        mu_post = _gate_proposal(
+            ctx,
+            repo_path,
+            head,
+            proposal,
+            config=config,
+            mu_pre=mu_pre,
+            base_counts=base_counts,
+            logs=logs,
+        )
+        if mu_post is None:
             continue
 
         vcs.commit(repo_path, f"txn:{step.id}")
         return TransactionResult(True, proposal, mu_pre, mu_post, logs=logs)
 
-    vcs.revert(repo_path, head)
+    # Every failed apply already reset the tree to head; skip the extra git calls.
+    if not applied_before:
+        vcs.revert(repo_path, head)
     return TransactionResult(False, None, mu_pre, mu_pre, logs=logs)
-
@@ -3,11 +3,14 @@
 from __future__ import annotations
 
 from dataclasses import dataclass, field
-from typing import Any, Dict, List, Optional, Tuple
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
 from typing import Literal
 
+if TYPE_CHECKING:  # pragma: no cover - import cycle guard
+    from .ast_index import AstIndex
 
-@dataclass(frozen=True)
+
+@dataclass(frozen=True, slots=True)
 class AstSpan:
     """Represents a span of code located by the AST index."""
 
@@ -19,7 +22,7 @@ class AstSpan:
     score: Optional[float] = None
 
 
-@dataclass
+@dataclass(slots=True)
 class Candidate:
     """Investigation candidate returned from the recall phase."""
 
@@ -29,7 +32,7 @@ class Candidate:
     evidence: Dict[str, Any] = field(default_factory=dict)
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Understanding:
     """High-level understanding synthesised from probes."""
 
@@ -38,7 +41,7 @@ class Understanding:
     dependencies: List[str]
 
 
-@dataclass
+@dataclass(slots=True)
 class PlanStep:
     """Atomic step in the execution plan."""
 
@@ -50,7 +53,7 @@ class PlanStep:
     check: str
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class DiffProposal:
     """Unified diff proposal returned from the proposer."""
 
@@ -62,7 +65,7 @@ class DiffProposal:
 # --- Spec-aligned models (fusion, planning, investigations) ---
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class Node:
     """Localized program entity in the subgraph."""
 
@@ -74,7 +77,7 @@ class Node:
     suspicion: float
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class Subgraph:
     """Neighborhood subgraph around failure signals."""
 
@@ -83,7 +86,7 @@ class Subgraph:
     slices: Dict[str, str]
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class ProbePatch:
     """A tiny investigative patch applied inside a sandbox only."""
 
@@ -95,7 +98,7 @@ class ProbePatch:
     rationale: str
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class ProbeReport:
     """Outcome of a single investigative probe run."""
 
@@ -108,7 +111,7 @@ class ProbeReport:
     artifacts: List[str]
 
 
-@dataclass
+@dataclass(slots=True)
 class Blackboard:
     """Shared evidence store for investigations (thread/process safe upstream)."""
 
@@ -119,7 +122,7 @@ class Blackboard:
     evidence: List[Dict[str, Any]] = field(default_factory=list)
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class FailurePattern:
     """Fused view of the failure with a primary location and alternatives."""
 
@@ -132,7 +135,7 @@ class FailurePattern:
     temporary_props: List[str]
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class Landmark:
     """Atomic repair landmark with explicit test and risk annotations."""
 
@@ -147,7 +150,7 @@ class Landmark:
     try_after: Optional[str] = None
 
 
-@dataclass
+@dataclass(slots=True)
 class TaskContext:
     """Execution context for a SWE-bench task."""
 
@@ -157,4 +160,6 @@ class TaskContext:
     targeted_expr: Optional[str]
     instance_id: str
     metadata: Dict[str, Any]
+    # Shared index built once per run so steps can slice without re-reading files.
+    ast_index: Optional["AstIndex"] = field(default=None, repr=False, compare=False)
 
@@ -2,8 +2,10 @@
 
 from __future__ import annotations
 
+import bisect
 import re
-from typing import Iterable, Set
+from dataclasses import dataclass
+from typing import AbstractSet, Iterable, Set
 
 from . import types
 
@@ -11,6 +13,23 @@ _DIFF_HEADER_RE = re.compile(r"^diff --git a/(?P<afile>[^\s]+) b/(?P<bfile>[^\s]
 _HUNK_HEADER_RE = re.compile(
     r"^@@ -(?P<old_start>\d+)(?:,(?P<old_count>\d+))? \+(?P<new_start>\d+)(?:,(?P<new_count>\d+))? @@"
 )
+# Classifies each diff line in one regex pass: file header, hunk header, or a
+# context/removed/added line. Anything else (e.g. "\ No newline") is skipped.
+_DIFF_LINE_RE = re.compile(
+    r"^(?:diff --git a/\S+ b/(?P<bfile>\S+)|(?P<hunk>@@.*)|(?P<op>[-+ ])(?P<text>.*))",
+    re.MULTILINE,
+)
+
+# A line that, stripped, starts with "+def"/"+class" and ends with "::". Line
+# boundaries are the ones str.splitlines() uses, all of which are whitespace.
+_LINE_BREAKS = "\n\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029"
+_DOUBLE_COLON_DEF_RE = re.compile(
+    rf"(?:\A|[{_LINE_BREAKS}])[^\S{_LINE_BREAKS}]*\+(?:def|class)"
+    rf"[^{_LINE_BREAKS}]*::[^\S{_LINE_BREAKS}]*(?:[{_LINE_BREAKS}]|\Z)"
+)
+
+# The first character of a line that starts with "+" or "-".
+_CHANGED_LINE_RE = re.compile(rf"(?:\A|[{_LINE_BREAKS}])[-+]")
 
 
 class ValidationError(RuntimeError):
@@ -24,53 +43,95 @@ def require_unified_diff(diff: str) -> None:
         raise ValidationError("Diff must start with 'diff --git'.")
     if "@@" not in diff:
         raise ValidationError("Diff must contain a hunk header '@@'.")
-    for line in diff.splitlines():
-        stripped = line.strip()
-        if stripped.startswith("+def") or stripped.startswith("+class"):
-            if stripped.endswith("::"):
-                raise ValidationError("Suspicious double-colon in definition header.")
+    if _DOUBLE_COLON_DEF_RE.search(diff):
+        raise ValidationError("Suspicious double-colon in definition header.")
 
 
 def _count_changed_loc(diff: str) -> int:
-    return sum(1 for line in diff.splitlines() if line.startswith("+") or line.startswith("-"))
+    # The ---/+++ file header lines start with "-"/"+" and are counted as well.
+    return len(_CHANGED_LINE_RE.findall(diff))
+
 
+def touched_files(diff: str) -> Set[str]:
+    """Return the post-image paths of every file section in *diff*."""
 
-def _touched_files(diff: str) -> Set[str]:
     matches = _DIFF_HEADER_RE.findall(diff)
     return {b for _a, b in matches}
 
 
-def _span_map(target_spans: Iterable[types.AstSpan], padding: int) -> dict[str, list[tuple[int, int]]]:
-    spans: dict[str, list[tuple[int, int]]] = {}
+_SpanRanges = dict[str, tuple[list[int], list[int]]]
+
+
+def _span_map(target_spans: Iterable[types.AstSpan], padding: int) -> _SpanRanges:
+    """Per file, padded span intervals merged and sorted as (starts, ends)."""
+
+    intervals: dict[str, list[tuple[int, int]]] = {}
     for span in target_spans:
         start = max(1, span.start_line - padding)
         end = max(start, span.end_line + padding)
-        spans.setdefault(span.file, []).append((start, end))
+        intervals.setdefault(span.file, []).append((start, end))
+    spans: _SpanRanges = {}
+    for file, ranges in intervals.items():
+        starts: list[int] = []
+        ends: list[int] = []
+        for start, end in sorted(ranges):
+            # Lines are integers, so touching intervals merge too.
+            if ends and start <= ends[-1] + 1:
+                ends[-1] = max(ends[-1], end)
+            else:
+                starts.append(start)
+                ends.append(end)
+        spans[file] = (starts, ends)
     return spans
 
 
-def _line_allowed(span_ranges: dict[str, list[tuple[int, int]]], file: str, line: int) -> bool:
-    ranges = span_ranges.get(file, [])
-    for start, end in ranges:
-        if start <= line <= end:
-            return True
-    return False
+@dataclass(frozen=True, slots=True)
+class PreparedSpans:
+    """Span lookups for one plan step, built once and shared across proposals."""
+
+    span_files: frozenset[str]
+    span_ranges: _SpanRanges
+
+
+def prepare_spans(target_spans: Iterable[types.AstSpan], padding_lines: int = 0) -> PreparedSpans:
+    spans = list(target_spans)
+    return PreparedSpans(
+        span_files=frozenset(span.file for span in spans),
+        span_ranges=_span_map(spans, padding_lines),
+    )
+
+
+def _line_allowed(bounds: tuple[list[int], list[int]] | None, line: int) -> bool:
+    """Whether ``line`` falls in one file's merged ``(starts, ends)`` intervals."""
+
+    if bounds is None:
+        return False
+    starts, ends = bounds
+    i = bisect.bisect_right(starts, line) - 1
+    return i >= 0 and line <= ends[i]
 
 
 def ensure_within_limits(
     diff: str,
     *,
-    allowed_files: Set[str],
+    allowed_files: AbstractSet[str],
     max_loc: int,
     max_files: int,
     target_spans: Iterable[types.AstSpan],
     padding_lines: int = 0,
     allow_api_change: bool = False,
+    prepared: PreparedSpans | None = None,
 ) -> None:
-    """Check diff obeys configured limits."""
+    """Check diff obeys configured limits.
+
+    ``prepared`` (from :func:`prepare_spans` over the same spans and padding)
+    skips rebuilding the span lookups when checking several proposals.
+    """
 
     require_unified_diff(diff)
-    files = _touched_files(diff)
+    # Whole-diff limits first: they need only C-level scans, so noisy
+    # proposals are rejected before the per-line walk.
+    files = touched_files(diff)
     if not files:
         raise ValidationError("Diff must touch at least one file header.")
     if len(files) > max_files:
@@ -80,28 +141,33 @@ def ensure_within_limits(
     loc = _count_changed_loc(diff)
     if loc > max_loc:
         raise ValidationError("Diff changes too many lines.")
-    span_files = {span.file for span in target_spans}
-    if not files.intersection(span_files):
+    if prepared is None:
+        prepared = prepare_spans(target_spans, padding_lines)
+    if files.isdisjoint(prepared.span_files):
         raise ValidationError("Diff does not touch any target span files.")
 
-    span_ranges = _span_map(target_spans, padding_lines)
+    span_ranges = prepared.span_ranges
     current_file: str | None = None
+    # The current file's span intervals, looked up once per file header.
+    bounds: tuple[list[int], list[int]] | None = None
     old_line = new_line = None
     # Track signature lines within a hunk to detect true signature edits
     removed_defs: set[str] = set()
     added_defs: set[str] = set()
-    for line in diff.splitlines():
-        header_match = _DIFF_HEADER_RE.match(line)
-        if header_match:
-            current_file = header_match.group("bfile")
-            old_line = new_line = None
-            removed_defs.clear()
-            added_defs.clear()
-            continue
-        if line.startswith("@@"):
+    for match in _DIFF_LINE_RE.finditer(diff):
+        op = match.group("op")
+        if op is None:
+            bfile = match.group("bfile")
+            if bfile is not None:
+                current_file = bfile
+                bounds = span_ranges.get(bfile)
+                old_line = new_line = None
+                removed_defs.clear()
+                added_defs.clear()
+                continue
             if current_file is None:
                 raise ValidationError("Hunk appears before diff header.")
-            hunk = _HUNK_HEADER_RE.match(line)
+            hunk = _HUNK_HEADER_RE.match(match.group("hunk"))
             if not hunk:
                 raise ValidationError("Malformed hunk header in diff.")
             old_line = int(hunk.group("old_start"))
@@ -110,39 +176,33 @@ def ensure_within_limits(
             removed_defs.clear()
             added_defs.clear()
             continue
-        if not line or current_file is None:
+        if current_file is None:
             continue
-        if line.startswith(" "):
+        if op == " ":
             if old_line is not None:
                 old_line += 1
             if new_line is not None:
                 new_line += 1
-            continue
-        if line.startswith("-"):
+        elif op == "-":
             if old_line is None:
                 raise ValidationError("Deletion encountered before hunk header.")
-            if not _line_allowed(span_ranges, current_file, old_line):
-                raise ValidationError(
-                    f"Deletion at {current_file}:{old_line} outside allowed spans."
-                )
+            if not _line_allowed(bounds, old_line):
+                raise ValidationError(f"Deletion at {current_file}:{old_line} outside allowed spans.")
             # Track signature changes
-            if line.startswith("-def ") and not allow_api_change:
-                removed_defs.add(line[1:].strip())
+            text = match.group("text")
+            if text.startswith("def ") and not allow_api_change:
+                removed_defs.add(text.strip())
             old_line += 1
-            continue
-        if line.startswith("+"):
+        else:
             if new_line is None:
                 raise ValidationError("Addition encountered before hunk header.")
-            if not _line_allowed(span_ranges, current_file, new_line):
-                raise ValidationError(
-                    f"Addition at {current_file}:{new_line} outside allowed spans."
-                )
+            if not _line_allowed(bounds, new_line):
+                raise ValidationError(f"Addition at {current_file}:{new_line} outside allowed spans.")
             # Track signature changes
-            if line.startswith("+def ") and not allow_api_change:
-                added_defs.add(line[1:].strip())
+            text = match.group("text")
+            if text.startswith("def ") and not allow_api_change:
+                added_defs.add(text.strip())
             new_line += 1
             # After updating per-line, if both sets present and unequal, treat as signature change
             if added_defs and removed_defs and (added_defs != removed_defs) and not allow_api_change:
                 raise ValidationError("Public API signature change detected in diff.")
-            continue
-        # Ignore lines such as "\\ No newline at end of file"
@@ -2,12 +2,34 @@
 
 from __future__ import annotations
 
+import os
+import re
+import shutil
 import subprocess
+import tempfile
 from pathlib import Path
-from typing import Any, Optional
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+
+# Resolved once rather than searched for along PATH by every git spawn.
+_GIT = shutil.which("git") or "git"
+# Line boundaries other than "\n" that str.splitlines() also splits on.
+_OTHER_LINE_BREAKS_RE = re.compile("[\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029]")
+# A file header that is not immediately followed by its ---/+++ lines.
+_BARE_HEADER_RE = re.compile(r"^diff --git[^\n]*(?:\n|\Z)(?!--- [^\n]*\n\+\+\+ )", re.MULTILINE)
+# One ``--numstat -z`` record: added, deleted, then the path -- or, for a
+# rename, an empty path field followed by the old and new paths.
+_NUMSTAT_RE = re.compile(rb"([-\d]+)\t([-\d]+)\t(?:\0[^\0]*\0)?([^\0]*)\0")
 
 
 def _normalize_diff(diff: str) -> str:
+    if not (
+        _BARE_HEADER_RE.search(diff)
+        or _OTHER_LINE_BREAKS_RE.search(diff)
+        or diff.endswith("\n\n")
+    ):
+        # Already has every header and nothing splitlines() would rewrite.
+        return diff
     lines = diff.splitlines()
     output: list[str] = []
     i = 0
@@ -46,7 +68,7 @@ def _run_git(
     **kwargs: Any,
 ) -> subprocess.CompletedProcess[str]:
     proc = subprocess.run(
-        ["git", *args],
+        [_GIT, *args],
         cwd=repo_path,
         input=input,
         text=True,
@@ -70,6 +92,8 @@ def apply_diff(diff: str, repo_path: str) -> None:
 
 def _manual_apply(diff: str, repo_path: str) -> None:
     lines = diff.splitlines()
+    # Sections for the same file are applied in order to one in-memory copy.
+    sections: dict[str, list[list[str]]] = {}
     i = 0
     while i < len(lines):
         if not lines[i].startswith("diff --git"):
@@ -87,12 +111,12 @@ def _manual_apply(diff: str, repo_path: str) -> None:
         while i < len(lines) and not lines[i].startswith("diff --git"):
             hunk.append(lines[i])
             i += 1
-        _apply_hunks(repo_path, b_path, hunk)
+        sections.setdefault(b_path, []).append(hunk)
+    for file_rel, hunks in sections.items():
+        _apply_hunks(repo_path, file_rel, hunks)
 
 
-def _apply_hunks(repo_path: str, file_rel: str, hunk_lines: list[str]) -> None:
-    path = Path(repo_path) / file_rel
-    original = path.read_text().splitlines(keepends=True)
+def _patch_lines(original: list[str], hunk_lines: list[str]) -> list[str]:
     pointer = 0
     output: list[str] = []
     for line in hunk_lines:
@@ -110,7 +134,26 @@ def _apply_hunks(repo_path: str, file_rel: str, hunk_lines: list[str]) -> None:
                 text += "\n"
             output.append(text)
     output.extend(original[pointer:])
-    path.write_text("".join(output))
+    return output
+
+
+def _apply_hunks(repo_path: str, file_rel: str, hunks: list[list[str]]) -> None:
+    """Read ``file_rel`` once, apply each section's lines, then swap it in atomically."""
+
+    path = Path(repo_path) / file_rel
+    content = path.read_text().splitlines(keepends=True)
+    for hunk_lines in hunks:
+        content = _patch_lines(content, hunk_lines)
+    mode = path.stat().st_mode
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as fh:
+            fh.write("".join(content))
+        os.chmod(tmp, mode)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
 
 
 def checkpoint(repo_path: str) -> str:
@@ -127,6 +170,41 @@ def revert(repo_path: str, commit_id: str) -> None:
     _run_git(repo_path, "clean", "-fd")
 
 
+def add_worktree(repo_path: str, path: str, commit_id: str) -> None:
+    """Check out ``commit_id`` into a detached linked worktree at ``path``."""
+
+    _run_git(repo_path, "worktree", "add", "--detach", path, commit_id)
+
+
+def remove_worktree(repo_path: str, path: str) -> None:
+    """Delete a linked worktree, discarding any changes left in it."""
+
+    _run_git(repo_path, "worktree", "remove", "--force", path, check=False)
+    _run_git(repo_path, "worktree", "prune", check=False)
+
+
+def numstat(repo_path: str, paths: Iterable[str] | None = None) -> Dict[str, Tuple[int, int]]:
+    """Added and deleted line counts per file of the working tree against the index.
+
+    Binary files are omitted. With *paths*, only those files are diffed.
+    """
+
+    cmd = [_GIT, "--literal-pathspecs", "diff", "--numstat", "-z"]
+    if paths is not None:
+        paths = list(paths)
+        if not paths:
+            return {}
+        cmd += ["--", *paths]
+    # Bytes, not text: paths are NUL-separated and need not be valid UTF-8.
+    proc = subprocess.run(cmd, cwd=repo_path, capture_output=True)
+    # Binary files report "-" for both counts.
+    return {
+        path.decode("utf-8", "surrogateescape"): (int(added), int(deleted))
+        for added, deleted, path in _NUMSTAT_RE.findall(proc.stdout)
+        if added.isdigit() and deleted.isdigit()
+    }
+
+
 def stage_all(repo_path: str) -> None:
     _run_git(repo_path, "add", "-A")
 
@@ -0,0 +1,199 @@
+import functools
+import os
+import shutil
+import subprocess
+import tempfile
+from pathlib import Path
+from typing import Callable, Dict, Tuple
+
+import pytest
+
+from coding_in_parallel import gates, llm, types
+
+_MOD_PY = b"def add(x, y):\n    return x - y\n"
+_GIT = shutil.which("git") or "git"
+# Build the template without reading the user's or system git config: nothing
+# there (templates, hooks, signing) can leak in, and git skips the lookups.
+_GIT_INIT_ENV = {**os.environ, "GIT_CONFIG_GLOBAL": os.devnull, "GIT_CONFIG_NOSYSTEM": "1"}
+
+
+def pytest_configure(config: pytest.Config) -> None:
+    # On CI, keep tmp_path trees (the git template and its per-test copies) on
+    # tmpfs when one is available. An explicit --basetemp, which is also how
+    # xdist hands workers their directories, always wins.
+    if config.option.basetemp or not os.environ.get("CI"):
+        return
+    shm = "/dev/shm"
+    if os.path.isdir(shm) and os.access(shm, os.W_OK):
+        # A fresh directory per run, so concurrent runs on one host never share
+        # (or wipe) each other's trees; it is removed again when the run ends.
+        basetemp = tempfile.mkdtemp(prefix="cip-pytest-", dir=shm)
+        config.option.basetemp = basetemp
+        config.add_cleanup(functools.partial(shutil.rmtree, basetemp, ignore_errors=True))
+
+
+def _git(path: Path, *args: str) -> None:
+    # Only a failure's message is of interest, so stdout is never piped.
+    subprocess.run(
+        [_GIT, *args],
+        cwd=path,
+        env=_GIT_INIT_ENV,
+        check=True,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+    )
+
+
+def _init_git_repo(path: Path) -> None:
+    # An empty --template skips the sample hooks and info/ files, roughly
+    # halving what every per-test copy of the template has to write.
+    _git(path, "init", "--template=")
+    # Identity goes straight into .git/config (no `git config` processes) so
+    # commits made later by the code under test still have an author.
+    with open(path / ".git" / "config", "a") as fh:
+        fh.write("[user]\n\temail = test@example.com\n\tname = Test User\n")
+    (path / "mod.py").write_bytes(_MOD_PY)
+    _git(path, "add", "mod.py")
+    _git(path, "commit", "-m", "init")
+
+
+@pytest.fixture(scope="session")
+def _template_repo(tmp_path_factory: pytest.TempPathFactory) -> Path:
+    if not os.environ.get("PYTEST_XDIST_WORKER"):
+        path = tmp_path_factory.mktemp("template")
+        _init_git_repo(path)
+        return path
+    # xdist workers share their run's base directory. The first to finish
+    # building publishes its template with an atomic rename and later
+    # workers reuse it; a worker that loses the race just keeps its own.
+    shared = tmp_path_factory.getbasetemp().parent / "template"
+    if shared.is_dir():
+        return shared
+    path = tmp_path_factory.mktemp("template")
+    _init_git_repo(path)
+    try:
+        os.rename(path, shared)
+    except OSError:
+        return path
+    return shared
+
+
+@pytest.fixture()
+def repo(_template_repo: Path, tmp_path: Path) -> Path:
+    """A fresh copy of a one-commit repo holding a buggy ``mod.py``."""
+    path = tmp_path / "repo"
+    shutil.copytree(_template_repo, path, symlinks=True)
+    return path
+
+
+@pytest.fixture()
+def plain_repo(tmp_path: Path) -> Path:
+    """The buggy ``mod.py`` alone, for tests that never read git state."""
+    path = tmp_path / "repo"
+    path.mkdir()
+    (path / "mod.py").write_bytes(_MOD_PY)
+    return path
+
+
+def _passing_static(repo_path: str) -> Tuple[bool, str]:
+    return True, "ok"
+
+
+def _passing_tests(test_cmd: str, repo_path: str) -> Tuple[bool, str]:
+    return True, "tests pass"
+
+
+@pytest.fixture()
+def stub_gates(monkeypatch: pytest.MonkeyPatch, request: pytest.FixtureRequest) -> None:
+    """Replace both gates with ones that pass.
+
+    Parametrize indirectly with ``{"static": fn}`` and/or ``{"tests": fn}``
+    to substitute a gate.
+    """
+    overrides = getattr(request, "param", {})
+    monkeypatch.setattr(gates, "run_static_checks", overrides.get("static", _passing_static))
+    monkeypatch.setattr(gates, "run_targeted_tests", overrides.get("tests", _passing_tests))
+
+
+@pytest.fixture()
+def stub_llm(monkeypatch: pytest.MonkeyPatch) -> Dict[str, str]:
+    """Route ``llm.complete`` through a prompt-substring -> response table.
+
+    Tests fill the returned dict; a prompt matching no key fails the test.
+    """
+    responses: Dict[str, str] = {}
+
+    def complete(prompt: str, **_: object) -> str:
+        for needle, response in responses.items():
+            if needle in prompt:
+                return response
+        raise AssertionError(f"unexpected prompt: {prompt[:200]!r}")
+
+    monkeypatch.setattr(llm, "complete", complete)
+    return responses
+
+
+# Shared plan objects for the one-function ``mod.py`` repo. They are built once
+# per session, so tests must not mutate them (use dataclasses.replace).
+@pytest.fixture(scope="session")
+def add_candidate() -> types.Candidate:
+    return types.Candidate(
+        id="cand-1",
+        hypothesis="add subtracts",
+        spans=[types.AstSpan(file="mod.py", start_line=1, end_line=2, node_type="FunctionDef")],
+        evidence={},
+    )
+
+
+@pytest.fixture(scope="session")
+def add_step(add_candidate: types.Candidate) -> types.PlanStep:
+    return types.PlanStep(
+        id="step-1",
+        intent="Fix add",
+        target_spans=add_candidate.spans,
+        constraints=[],
+        ideal_outcome="add sums",
+        check="tests",
+    )
+
+
+# kind -> (unified diff against the template ``mod.py``, rationale).
+_DIFF_TEMPLATES: Dict[str, Tuple[str, str]] = {
+    "add_fix": (
+        "diff --git a/mod.py b/mod.py\n@@ -1,2 +1,2 @@\n-def add(x, y):\n-    return x - y\n"
+        "+def add(x, y):\n+    return x + y\n",
+        "fix",
+    ),
+    "add_fix_commuted": (
+        "diff --git a/mod.py b/mod.py\n@@ -1,2 +1,2 @@\n def add(x, y):\n-    return x - y\n"
+        "+    return y + x\n",
+        "fix",
+    ),
+    "add_docstring": (
+        "diff --git a/mod.py b/mod.py\n@@\n+def add(x, y):\n+    \"\"\"Add two numbers.\"\"\"\n"
+        "+    return x + y\n",
+        "add docstring",
+    ),
+    "add_dead_code": (
+        "diff --git a/mod.py b/mod.py\n@@ -1,2 +1,5 @@\n def add(x, y):\n-    return x - y\n"
+        "+    return x - y\n+\n+def helper():\n+    return 41\n",
+        "noop",
+    ),
+}
+
+
+@functools.lru_cache(maxsize=None)
+def _make_diff(step_id: str, kind: str) -> types.DiffProposal:
+    unified_diff, rationale = _DIFF_TEMPLATES[kind]
+    return types.DiffProposal(step_id=step_id, unified_diff=unified_diff, rationale=rationale)
+
+
+@pytest.fixture(scope="session")
+def make_diff() -> Callable[[str, str], types.DiffProposal]:
+    """Factory for the canned ``mod.py`` diffs, one shared proposal per key."""
+    return _make_diff
+
+
+@pytest.fixture(scope="session")
+def add_fix(make_diff: Callable[[str, str], types.DiffProposal]) -> types.DiffProposal:
+    return make_diff("step-1", "add_fix")
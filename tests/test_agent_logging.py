@@ -1,6 +1,8 @@
+import json
 from pathlib import Path
 
 from coding_in_parallel import logging as agent_logging
+from coding_in_parallel import types
 
 
 def test_run_logger_creates_files(tmp_path: Path):
@@ -16,5 +18,33 @@ def test_run_logger_creates_files(tmp_path: Path):
 def test_run_logger_events_stream_to_file(tmp_path: Path):
     logger = agent_logging.RunLogger(base_dir=tmp_path, run_id="demo2", stream=False)
     logger.log_event("unit.test", step_id="s1", committed=False)
+    logger.close()
     events = (tmp_path / "demo2" / "events.ndjson").read_text().splitlines()
     assert events and "\"kind\":\"unit.test\"" in events[0]
+
+
+def test_run_logger_skips_json_when_artifacts_disabled(tmp_path: Path):
+    logger = agent_logging.RunLogger(base_dir=tmp_path, run_id="demo3", artifacts=False)
+    assert not logger.json_enabled
+    assert logger.log_json("plan", [1]) is None
+    assert not (tmp_path / "demo3" / "plan.json").exists()
+
+
+def test_run_logger_buffers_events_until_flush(tmp_path: Path):
+    logger = agent_logging.RunLogger(base_dir=tmp_path, run_id="demo4", stream=False)
+    events_path = tmp_path / "demo4" / "events.ndjson"
+    logger.log_event("unit.buffered")
+    assert events_path.read_text() == ""
+    logger.flush()
+    assert "unit.buffered" in events_path.read_text()
+    logger.close()
+    logger.close()
+
+
+def test_run_logger_serializes_dataclasses(tmp_path: Path):
+    logger = agent_logging.RunLogger(base_dir=tmp_path, run_id="demo5")
+    span = types.AstSpan(file="mod.py", start_line=1, end_line=2, node_type="FunctionDef")
+    path = logger.log_json("spans", [span])
+    assert json.loads(path.read_text()) == [
+        {"file": "mod.py", "start_line": 1, "end_line": 2, "node_type": "FunctionDef", "symbol": None, "score": None}
+    ]
@@ -1,35 +1,225 @@
+import os
+import time
 from pathlib import Path
 
 import pytest
 
-from coding_in_parallel import ast_index
+from coding_in_parallel import _fs, ast_index
 
+_INIT_PY = b"from .module import greet\n"
+_MODULE_PY = (
+    b"def greet(name: str) -> str:\n    return f'Hello {name}'\n\n\n"
+    b"class Speaker:\n    def say(self, message: str) -> str:\n        return greet(message)\n"
+)
 
-@pytest.fixture()
-def sample_repo(tmp_path: Path) -> Path:
-    package = tmp_path / "pkg"
+
+def _write_sample_package(root: Path) -> Path:
+    package = root / "pkg"
     package.mkdir()
-    (package / "__init__.py").write_text("from .module import greet\n")
-    (package / "module.py").write_text(
-        """def greet(name: str) -> str:\n    return f'Hello {name}'\n\n\nclass Speaker:\n    def say(self, message: str) -> str:\n        return greet(message)\n"""
-    )
+    (package / "__init__.py").write_bytes(_INIT_PY)
+    (package / "module.py").write_bytes(_MODULE_PY)
     return package
 
 
-def test_build_index_finds_definitions(sample_repo: Path):
-    index = ast_index.build_index(sample_repo)
+@pytest.fixture()
+def sample_repo(tmp_path: Path) -> Path:
+    return _write_sample_package(tmp_path)
+
+
+# Built and indexed once per module; tests that edit files use sample_repo.
+@pytest.fixture(scope="module")
+def shared_repo(tmp_path_factory: pytest.TempPathFactory) -> Path:
+    return _write_sample_package(tmp_path_factory.mktemp("repo"))
+
+
+@pytest.fixture(scope="module")
+def index(shared_repo: Path) -> ast_index.AstIndex:
+    return ast_index.build_index(shared_repo)
+
+
+def test_build_index_finds_definitions(index: ast_index.AstIndex):
     spans = index.lookup_symbol("greet")
     assert spans, "Expected greet definition span"
     span = spans[0]
     assert span.file.endswith("module.py")
     assert span.node_type == "FunctionDef"
-    calls = index.lookup_calls("greet")
-    assert any(call.file.endswith("module.py") for call in calls)
+    assert "module.py" in index.call_files("greet")
+    assert not index.call_files("missing")
 
 
-def test_slice_reads_requested_lines(sample_repo: Path):
-    index = ast_index.build_index(sample_repo)
+def test_spans_in_file_groups_symbols_by_file(index: ast_index.AstIndex):
+    assert {span.symbol for span in index.spans_in_file("module.py")} == {"greet", "Speaker", "say"}
+    assert index.spans_in_file("__init__.py") == []
+    (say,) = [span for span in index.find_spans_covering("module.py", 7) if span.symbol == "say"]
+    assert say.node_type == "FunctionDef"
+
+
+def test_slice_reads_requested_lines(index: ast_index.AstIndex):
     slice_text = index.slice("module.py", 1, 2)
     assert "def greet" in slice_text
     assert "return f'Hello" in slice_text
 
+
+def test_build_index_reuses_parse_cache(sample_repo: Path, tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    cache_dir = tmp_path / "ast-cache"
+    first = ast_index.build_index(sample_repo, cache_dir=cache_dir)
+    assert len(list(cache_dir.glob("*.pkl"))) == 2
+
+    def fail_parse(*_args, **_kwargs):
+        raise AssertionError("expected cached parse")
+
+    monkeypatch.setattr(ast_index, "_parse", fail_parse)
+    second = ast_index.build_index(sample_repo, cache_dir=cache_dir)
+    assert second.lookup_symbol("greet") == first.lookup_symbol("greet")
+
+
+def test_build_index_treats_parse_cache_failures_as_misses(
+    sample_repo: Path, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+):
+    cache_dir = tmp_path / "ast-cache"
+    expected = ast_index.build_index(sample_repo, cache_dir=cache_dir).lookup_symbol("greet")
+    for entry in cache_dir.glob("*.pkl"):
+        entry.write_bytes(b"not a pickle")
+
+    def fail_dump(*_args, **_kwargs):
+        raise OSError("No space left on device")
+
+    monkeypatch.setattr(ast_index.pickle, "dump", fail_dump)
+    index = ast_index.build_index(sample_repo, cache_dir=cache_dir, force=True)
+    assert index.lookup_symbol("greet") == expected
+    assert not list(cache_dir.glob("*.tmp"))
+
+
+def test_build_index_parallel_matches_serial(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    for i in range(4):
+        (tmp_path / f"mod{i}.py").write_text(f"def f{i}():\n    return helper()\n")
+    monkeypatch.setattr(_fs, "PARALLEL_MIN_FILES", 2)
+    serial = ast_index.build_index(tmp_path, max_workers=1)
+    parallel = ast_index.build_index(tmp_path, max_workers=2, force=True)
+    assert parallel.lookup_calls("helper") == serial.lookup_calls("helper")
+    assert parallel.lookup_symbol("f3") == serial.lookup_symbol("f3")
+
+
+def test_build_index_sizes_pool_to_the_tree(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    for i in range(5):
+        (tmp_path / f"mod{i}.py").write_text(f"def f{i}():\n    pass\n")
+    monkeypatch.setattr(_fs, "PARALLEL_MIN_FILES", 2)
+    pools = []
+    real_pool = ast_index.ProcessPoolExecutor
+
+    def recording_pool(max_workers: int):
+        pools.append(max_workers)
+        return real_pool(max_workers=max_workers)
+
+    monkeypatch.setattr(ast_index, "ProcessPoolExecutor", recording_pool)
+    ast_index.build_index(tmp_path, max_workers=8)
+    assert pools == [2]
+    monkeypatch.setattr(_fs, "PARALLEL_MIN_FILES", 3)
+    index = ast_index.build_index(tmp_path, max_workers=8, force=True)
+    assert pools == [2]
+    assert index.lookup_symbol("f4")
+
+
+def test_build_index_shares_equal_spans(tmp_path: Path):
+    (tmp_path / "mod.py").write_text("def f(x):\n    return x\n\n\nf(f(1))\n")
+    index = ast_index.build_index(tmp_path)
+    outer, inner = index.lookup_calls("f")
+    assert outer is inner
+
+
+def test_build_index_skips_envs_and_shallow_indexes_vendored(tmp_path: Path):
+    (tmp_path / ".venv" / "lib").mkdir(parents=True)
+    (tmp_path / ".venv" / "lib" / "dep.py").write_text("def hidden():\n    pass\n")
+    (tmp_path / "vendor").mkdir()
+    (tmp_path / "vendor" / "lib.py").write_text("def outer():\n    def inner():\n        pass\n    return inner()\n")
+    index = ast_index.build_index(tmp_path)
+    assert not index.lookup_symbol("hidden")
+    assert index.lookup_symbol("outer")
+    assert not index.lookup_symbol("inner")
+    assert not index.lookup_calls("inner")
+
+
+def test_build_index_prunes_build_output_only_at_root(tmp_path: Path):
+    for rel in ("build/gen.py", "dist/pkg.py", "pkg/build/steps.py"):
+        (tmp_path / rel).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / rel).write_text(f"def {Path(rel).stem}():\n    pass\n")
+    index = ast_index.build_index(tmp_path)
+    assert not index.lookup_symbol("gen")
+    assert not index.lookup_symbol("pkg")
+    assert [span.file for span in index.lookup_symbol("steps")] == ["pkg/build/steps.py"]
+
+
+def test_slice_clamps_padding_to_file_bounds(shared_repo: Path, index: ast_index.AstIndex):
+    text = (shared_repo / "module.py").read_text()
+    assert index.slice("module.py", 1, 2, padding=100) == text
+    assert index.slice("module.py", 50, 60) == ""
+
+
+def test_refresh_reloads_edited_files(sample_repo: Path):
+    index = ast_index.build_index(sample_repo)
+    assert "def greet" in index.slice("module.py", 1, 1)
+    (sample_repo / "module.py").write_text("def hello():\n    pass\n")
+    index.refresh(["module.py"])
+    assert index.slice("module.py", 1, 1) == "def hello():\n"
+
+
+def test_build_index_keeps_calls_in_module_level_code(tmp_path: Path):
+    (tmp_path / "__init__.py").write_text('"""Package."""\nfrom .mod import f\n__all__ = ["f"]\n')
+    (tmp_path / "setup.py").write_text("import setuptools\nsetuptools.setup(name='x')\n")
+    index = ast_index.build_index(tmp_path)
+    assert index.lookup_calls("setup")
+
+
+
+def test_build_index_keeps_calls_in_annotations(tmp_path: Path):
+    (tmp_path / "models.py").write_text("from typing import Annotated\nx: Annotated[int, Field()] = 1\n")
+    index = ast_index.build_index(tmp_path)
+    assert index.lookup_calls("Field")
+
+
+def test_build_index_reuses_file_listing_until_tree_changes(
+    sample_repo: Path, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+):
+    cache_dir = tmp_path / "ast-cache"
+    settled = time.time_ns() - 60_000_000_000
+    os.utime(sample_repo, ns=(settled, settled))
+    ast_index.build_index(sample_repo, cache_dir=cache_dir)
+    walk = _fs.walk_python_files
+    walked = []
+    monkeypatch.setattr(_fs, "walk_python_files", lambda *a: walked.append(a) or walk(*a))
+
+    ast_index.build_index(sample_repo, cache_dir=cache_dir)
+    assert not walked
+
+    (sample_repo / "extra.py").write_text("def extra():\n    pass\n")
+    index = ast_index.build_index(sample_repo, cache_dir=cache_dir)
+    assert walked
+    assert index.lookup_symbol("extra")
+
+
+def test_build_index_reuses_unchanged_tree_in_process(
+    sample_repo: Path, monkeypatch: pytest.MonkeyPatch
+):
+    settled = time.time_ns() - 60_000_000_000
+    for path in sample_repo.iterdir():
+        os.utime(path, ns=(settled, settled))
+    first = ast_index.build_index(sample_repo)
+
+    index_one = ast_index._index_one
+    indexed = []
+    monkeypatch.setattr(ast_index, "_index_one", lambda *a: indexed.append(a[1]) or index_one(*a))
+    second = ast_index.build_index(sample_repo)
+    assert not indexed
+    assert second is not first
+    assert second.lookup_symbol("greet") == first.lookup_symbol("greet")
+
+    # Copies do not share refreshed source.
+    (sample_repo / "module.py").write_text("def hello():\n    pass\n")
+    second.refresh(["module.py"])
+    assert "def greet" in first.slice("module.py", 1, 1)
+
+    third = ast_index.build_index(sample_repo)
+    assert "module.py" in indexed
+    assert third.lookup_symbol("hello") and not third.lookup_symbol("greet")
+    ast_index.build_index(sample_repo, force=True)
+    assert indexed.count("module.py") == 2
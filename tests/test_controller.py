@@ -1,28 +1,30 @@
+from dataclasses import replace
 from pathlib import Path
-import subprocess
 
 import pytest
 
-from coding_in_parallel import config as config_module, controller, investigator, planner, proposer, tnr, types
+from coding_in_parallel import (
+    ast_index,
+    config as config_module,
+    controller,
+    gates,
+    investigator,
+    logging,
+    planner,
+    proposer,
+    tnr,
+    types,
+)
 
 
-def _init_git_repo(path: Path) -> None:
-    subprocess.run(["git", "init"], cwd=path, check=True, capture_output=True)
-    subprocess.run(["git", "config", "user.email", "test@example.com"], cwd=path, check=True)
-    subprocess.run(["git", "config", "user.name", "Test User"], cwd=path, check=True)
-    (path / "mod.py").write_text("def add(x, y):\n    return x - y\n")
-    subprocess.run(["git", "add", "mod.py"], cwd=path, check=True)
-    subprocess.run(["git", "commit", "-m", "init"], cwd=path, check=True, capture_output=True)
+@pytest.fixture(autouse=True)
+def _isolated_cwd(monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> None:
+    # Default configs log to a relative .agent_runs; keep parallel workers apart.
+    monkeypatch.chdir(tmp_path)
 
 
-@pytest.fixture()
-def repo(tmp_path: Path) -> Path:
-    _init_git_repo(tmp_path)
-    return tmp_path
-
-
-def test_run_controller_applies_committed_diff(monkeypatch: pytest.MonkeyPatch, repo: Path):
-    ctx = types.TaskContext(
+def _make_ctx(repo: Path, **overrides) -> types.TaskContext:
+    fields = dict(
         repo_path=str(repo),
         failing_tests=["tests/test_mod.py::test_add"],
         test_cmd="pytest -k add",
@@ -30,32 +32,38 @@ def test_run_controller_applies_committed_diff(monkeypatch: pytest.MonkeyPatch,
         instance_id="example-1",
         metadata={},
     )
-    candidate = types.Candidate(
-        id="cand-1",
-        hypothesis="add subtracts",
-        spans=[types.AstSpan(file="mod.py", start_line=1, end_line=2, node_type="FunctionDef")],
-        evidence={},
-    )
-    step = types.PlanStep(
-        id="step-1",
-        intent="Fix add",
-        target_spans=candidate.spans,
-        constraints=[],
-        ideal_outcome="add sums",
-        check="tests",
-    )
-    diff = types.DiffProposal(
-        step_id="step-1",
-        unified_diff="""diff --git a/mod.py b/mod.py\n@@ -1,2 +1,2 @@\n-def add(x, y):\n-    return x - y\n+def add(x, y):\n+    return x + y\n""",
-        rationale="fix",
-    )
+    fields.update(overrides)
+    return types.TaskContext(**fields)
 
-    monkeypatch.setattr(investigator, "recall_candidates", lambda ctx: [candidate])
-    monkeypatch.setattr(investigator, "probe", lambda ctx, cands: cands)
-    monkeypatch.setattr(planner, "synthesize", lambda cands: types.Understanding("Fix add", [], []))
-    monkeypatch.setattr(planner, "plan", lambda understanding: [step])
-    monkeypatch.setattr(proposer, "propose", lambda step, ctx_files, config: [diff])
 
+@pytest.fixture()
+def run_logger(tmp_path: Path):
+    """An events-only logger for driving ``controller._run_step`` directly."""
+    logger = logging.RunLogger(tmp_path / "runs", "unit", artifacts=False)
+    yield logger
+    logger.close()
+
+
+@pytest.fixture(scope="module", autouse=True)
+def _single_step_pipeline(
+    add_candidate: types.Candidate,
+    add_step: types.PlanStep,
+    add_fix: types.DiffProposal,
+):
+    """Stub recall through proposal once per module: one step, one fixing diff.
+
+    Tests needing a different pipeline override pieces with ``monkeypatch``.
+    """
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(investigator, "recall_candidates", lambda ctx: [add_candidate])
+        mp.setattr(investigator, "probe", lambda ctx, cands: cands)
+        mp.setattr(planner, "synthesize", lambda cands: types.Understanding("Fix add", [], []))
+        mp.setattr(planner, "plan", lambda understanding: [add_step])
+        mp.setattr(proposer, "propose", lambda step, ctx_files, config, cache=True: [add_fix])
+        yield
+
+
+def _committed_txn(diff: types.DiffProposal):
     def fake_txn(context, plan_step, proposals, *, config):
         return tnr.TransactionResult(
             committed=True,
@@ -64,24 +72,72 @@ def test_run_controller_applies_committed_diff(monkeypatch: pytest.MonkeyPatch,
             mu_post=1,
         )
 
-    monkeypatch.setattr(tnr, "txn_patch", fake_txn)
-
-    cfg = config_module.Config.default()
-    result = controller.run_controller(ctx, config=cfg)
-    assert result.final_patch == diff.unified_diff
-    assert result.transactions[0].committed
+    return fake_txn
+
+
+@pytest.mark.parametrize(
+    "diff_kind, source",
+    [
+        ("add_fix", "def add(x, y):\n    return x + y\n"),
+        ("add_fix_commuted", "def add(x, y):\n    return y + x\n"),
+    ],
+)
+def test_run_step_commits_fix(
+    monkeypatch: pytest.MonkeyPatch,
+    repo: Path,
+    add_step: types.PlanStep,
+    make_diff,
+    run_logger: logging.RunLogger,
+    diff_kind: str,
+    source: str,
+):
+    fix = make_diff(add_step.id, diff_kind)
+    monkeypatch.setattr(proposer, "propose", lambda step, ctx_files, config, cache=True: [fix])
+    monkeypatch.setattr(gates, "run_targeted_tests", lambda cmd, repo_path: (True, ""))
+
+    transactions = controller._run_step(
+        _make_ctx(repo), add_step, config_module.Config.default(), run_logger
+    )
+    assert len(transactions) == 1
+    assert transactions[0].committed
+    assert transactions[0].applied_diff is fix
+    assert (repo / "mod.py").read_text() == source
+
+
+def test_run_step_regenerates_after_recoverable_failure(
+    monkeypatch: pytest.MonkeyPatch,
+    plain_repo: Path,
+    add_step: types.PlanStep,
+    add_fix: types.DiffProposal,
+    run_logger: logging.RunLogger,
+):
+    results = iter([
+        tnr.TransactionResult(False, None, 0, 0, logs=["validation failed: too many files"]),
+        tnr.TransactionResult(True, add_fix, 0, 0),
+    ])
+    monkeypatch.setattr(tnr, "txn_patch", lambda *args, **kwargs: next(results))
+
+    cache_flags = []
+
+    def fake_propose(step, ctx_files, config, cache=True):
+        cache_flags.append(cache)
+        return [add_fix]
+
+    monkeypatch.setattr(proposer, "propose", fake_propose)
+
+    transactions = controller._run_step(
+        _make_ctx(plain_repo), add_step, config_module.Config.default(), run_logger
+    )
+    assert [txn.committed for txn in transactions] == [False, True]
+    # The retry re-sends the same prompt, so it must not be served from cache.
+    assert cache_flags == [True, False]
 
 
-def test_run_controller_processes_all_steps(monkeypatch: pytest.MonkeyPatch, repo: Path):
+def test_run_controller_processes_all_steps(
+    monkeypatch: pytest.MonkeyPatch, repo: Path, make_diff
+):
     """Test that controller processes all plan steps, not just the first committed one."""
-    ctx = types.TaskContext(
-        repo_path=str(repo),
-        failing_tests=["tests/test_mod.py::test_add"],
-        test_cmd="pytest -k add",
-        targeted_expr=None,
-        instance_id="example-1",
-        metadata={},
-    )
+    ctx = _make_ctx(repo)
 
     # Create two steps
     step1 = types.PlanStep(
@@ -108,23 +164,13 @@ def test_run_controller_processes_all_steps(monkeypatch: pytest.MonkeyPatch, rep
         evidence={},
     )
 
-    diff1 = types.DiffProposal(
-        step_id="step-1",
-        unified_diff="""diff --git a/mod.py b/mod.py\n@@\n-def add(x, y):\n-    return x - y\n+def add(x, y):\n+    return x + y\n""",
-        rationale="fix",
-    )
-    diff2 = types.DiffProposal(
-        step_id="step-2",
-        unified_diff="""diff --git a/mod.py b/mod.py\n@@\n+def add(x, y):\n+    \"\"\"Add two numbers.\"\"\"\n+    return x + y\n""",
-        rationale="add docstring",
-    )
+    diff1 = make_diff("step-1", "add_fix")
+    diff2 = make_diff("step-2", "add_docstring")
 
     monkeypatch.setattr(investigator, "recall_candidates", lambda ctx: [candidate])
-    monkeypatch.setattr(investigator, "probe", lambda ctx, cands: cands)
-    monkeypatch.setattr(planner, "synthesize", lambda cands: types.Understanding("Fix add", [], []))
     monkeypatch.setattr(planner, "plan", lambda understanding: [step1, step2])
     # Avoid LLM dependency by stubbing proposer
-    monkeypatch.setattr(proposer, "propose", lambda step, ctx_files, config: [diff1] if step.id == "step-1" else [diff2])
+    monkeypatch.setattr(proposer, "propose", lambda step, ctx_files, config, cache=True: [diff1] if step.id == "step-1" else [diff2])
 
     call_count = 0
     def fake_txn(context, plan_step, proposals, *, config):
@@ -161,73 +207,22 @@ def test_run_controller_processes_all_steps(monkeypatch: pytest.MonkeyPatch, rep
     assert "\"\"\"Add two numbers.\"\"\"" in result.final_patch
 
 
-def test_run_controller_with_logging(monkeypatch: pytest.MonkeyPatch, repo: Path, tmp_path: Path):
+def test_run_controller_with_logging(
+    monkeypatch: pytest.MonkeyPatch, repo: Path, tmp_path: Path, add_fix: types.DiffProposal
+):
     """Test that controller integrates with RunLogger to persist artifacts."""
-    from coding_in_parallel import logging
+    ctx = _make_ctx(repo)
+    monkeypatch.setattr(tnr, "txn_patch", _committed_txn(add_fix))
 
-    ctx = types.TaskContext(
-        repo_path=str(repo),
-        failing_tests=["tests/test_mod.py::test_add"],
-        test_cmd="pytest -k add",
-        targeted_expr=None,
-        instance_id="example-1",
-        metadata={},
-    )
-
-    candidate = types.Candidate(
-        id="cand-1",
-        hypothesis="add subtracts",
-        spans=[types.AstSpan(file="mod.py", start_line=1, end_line=2, node_type="FunctionDef")],
-        evidence={},
-    )
-    step = types.PlanStep(
-        id="step-1",
-        intent="Fix add",
-        target_spans=candidate.spans,
-        constraints=[],
-        ideal_outcome="add sums",
-        check="tests",
+    # Record artifact writes without serializing anything to disk
+    logged_calls = []
+    monkeypatch.setattr(
+        logging.RunLogger, "log_json", lambda self, name, data: logged_calls.append(("json", name))
     )
-    diff = types.DiffProposal(
-        step_id="step-1",
-        unified_diff="""diff --git a/mod.py b/mod.py\n@@ -1,2 +1,2 @@\n-def add(x, y):\n-    return x - y\n+def add(x, y):\n+    return x + y\n""",
-        rationale="fix",
+    monkeypatch.setattr(
+        logging.RunLogger, "log_text", lambda self, name, text: logged_calls.append(("text", name))
     )
 
-    monkeypatch.setattr(investigator, "recall_candidates", lambda ctx: [candidate])
-    monkeypatch.setattr(investigator, "probe", lambda ctx, cands: cands)
-    monkeypatch.setattr(planner, "synthesize", lambda cands: types.Understanding("Fix add", [], []))
-    monkeypatch.setattr(planner, "plan", lambda understanding: [step])
-    monkeypatch.setattr(proposer, "propose", lambda step, ctx_files, config: [diff])
-
-    def fake_txn(context, plan_step, proposals, *, config):
-        return tnr.TransactionResult(
-            committed=True,
-            applied_diff=diff,
-            mu_pre=0,
-            mu_post=1,
-        )
-
-    monkeypatch.setattr(tnr, "txn_patch", fake_txn)
-
-    # Mock the logger to capture calls
-    logged_calls = []
-    original_log_json = logging.RunLogger.log_json
-    original_log_text = logging.RunLogger.log_text
-
-    def mock_log_json(self, name: str, data):
-        logged_calls.append(('json', name, data))
-        return original_log_json(self, name, data)
-
-    def mock_log_text(self, name: str, text: str):
-        logged_calls.append(('text', name, text))
-        return original_log_text(self, name, text)
-
-    monkeypatch.setattr(logging.RunLogger, 'log_json', mock_log_json)
-    monkeypatch.setattr(logging.RunLogger, 'log_text', mock_log_text)
-
-    # Create a logger instance
-    logger = logging.RunLogger(str(tmp_path / "test_run"))
     # Build config with logging dir set (frozen dataclass)
     cfg = config_module.Config.from_dict({"logging": {"dir": str(tmp_path / "test_runs")}})
 
@@ -237,54 +232,29 @@ def test_run_controller_with_logging(monkeypatch: pytest.MonkeyPatch, repo: Path
     # Verify logging happened
     assert len(logged_calls) > 0
     # Should have logged understanding, plan, and transactions at minimum
-    logged_names = [name for _, name, _ in logged_calls]
+    logged_names = [name for _, name in logged_calls]
     assert any('understanding' in name for name in logged_names)
     assert any('plan' in name for name in logged_names)
     assert any('transactions' in name for name in logged_names)
 
 
-def test_controller_builds_targeted_test_cmd(monkeypatch: pytest.MonkeyPatch, repo: Path):
-    """Controller should derive a -k expression from failing tests when appropriate."""
-    from coding_in_parallel import gates
-
-    ctx = types.TaskContext(
-        repo_path=str(repo),
+def test_run_step_uses_targeted_test_cmd(
+    monkeypatch: pytest.MonkeyPatch,
+    repo: Path,
+    add_step: types.PlanStep,
+    run_logger: logging.RunLogger,
+):
+    """The -k expression derived from failing tests reaches the gates."""
+    ctx = _make_ctx(
+        repo,
         failing_tests=[
             "pkg/tests/test_calc.py::test_add",
             "pkg/tests/test_calc.py::test_sub",
         ],
         test_cmd="pytest -q",  # broad command; should be specialized
-        targeted_expr=None,
         instance_id="example-2",
-        metadata={},
     )
 
-    candidate = types.Candidate(
-        id="cand-1",
-        hypothesis="add subtracts",
-        spans=[types.AstSpan(file="mod.py", start_line=1, end_line=2, node_type="FunctionDef")],
-        evidence={},
-    )
-    step = types.PlanStep(
-        id="step-1",
-        intent="Fix add",
-        target_spans=candidate.spans,
-        constraints=[],
-        ideal_outcome="add sums",
-        check="tests",
-    )
-    diff = types.DiffProposal(
-        step_id="step-1",
-        unified_diff="""diff --git a/mod.py b/mod.py\n@@ -1,2 +1,2 @@\n-def add(x, y):\n-    return x - y\n+def add(x, y):\n+    return x + y\n""",
-        rationale="fix",
-    )
-
-    monkeypatch.setattr(investigator, "recall_candidates", lambda ctx: [candidate])
-    monkeypatch.setattr(investigator, "probe", lambda ctx, cands: cands)
-    monkeypatch.setattr(planner, "synthesize", lambda cands: types.Understanding("Fix add", [], []))
-    monkeypatch.setattr(planner, "plan", lambda understanding: [step])
-    monkeypatch.setattr(proposer, "propose", lambda step, ctx_files, config: [diff])
-
     seen_cmds = []
     def fake_run_targeted(cmd: str, repo_path: str):
         seen_cmds.append(cmd)
@@ -293,8 +263,23 @@ def test_controller_builds_targeted_test_cmd(monkeypatch: pytest.MonkeyPatch, re
     monkeypatch.setattr(gates, "run_targeted_tests", fake_run_targeted)
 
     cfg = config_module.Config.default()
-    result = controller.run_controller(ctx, config=cfg)
-    assert result.transactions[0].committed
+    ctx = replace(ctx, test_cmd=controller._derive_test_cmd(ctx, cfg))
+    transactions = controller._run_step(ctx, add_step, cfg, run_logger)
+    assert transactions[0].committed
     # Must have passed a -k expression containing both test names
     assert seen_cmds and "-k" in seen_cmds[0]
     assert "test_add" in seen_cmds[0] and "test_sub" in seen_cmds[0]
+
+
+@pytest.mark.parametrize("use_index", [False, True])
+def test_load_context_skips_spans_past_end_of_file(
+    repo: Path, add_step: types.PlanStep, use_index: bool
+):
+    stale = types.AstSpan(file="mod.py", start_line=40, end_line=42, node_type="FunctionDef")
+    step = replace(add_step, target_spans=[*add_step.target_spans, stale])
+    index = ast_index.build_index(repo) if use_index else None
+
+    context = controller._load_context(str(repo), step, padding=0, index=index)
+
+    assert context["mod.py"].startswith("LINES 1-2:\n")
+    assert "LINES 40" not in context["mod.py"]
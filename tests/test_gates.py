@@ -1,7 +1,9 @@
+import os
+import subprocess
 import sys
 from pathlib import Path
 
-from coding_in_parallel import gates
+from coding_in_parallel import _fs, gates
 
 
 def test_run_static_checks_detects_syntax_error(tmp_path: Path):
@@ -13,9 +15,75 @@ def test_run_static_checks_detects_syntax_error(tmp_path: Path):
     assert "SyntaxError" in output
 
 
-def test_run_targeted_tests_executes_command(tmp_path: Path):
-    script = tmp_path / "script.py"
-    script.write_text("import sys; sys.exit(0)")
-    ok, output = gates.run_targeted_tests(f"{sys.executable} {script}", str(tmp_path))
+def test_run_targeted_tests_executes_command(tmp_path: Path, monkeypatch):
+    calls = []
+
+    def fake_run(argv, **kwargs):
+        calls.append((argv, kwargs["cwd"]))
+        return subprocess.CompletedProcess(argv, 0, b"collected 1 item", b"")
+
+    monkeypatch.setattr(gates.subprocess, "run", fake_run)
+    ok, output = gates.run_targeted_tests('pytest -q -k "test_add or test_sub"', str(tmp_path))
     assert ok
+    assert output == ""
+    assert calls == [(("pytest", "-q", "-k", "test_add or test_sub"), str(tmp_path))]
+
+
+def test_run_targeted_tests_returns_output_only_on_failure(tmp_path: Path):
+    script = tmp_path / "script.py"
+    script.write_text("import sys; print('chatty'); sys.exit(int(sys.argv[1]))")
+    assert gates.run_targeted_tests(f"{sys.executable} {script} 0", str(tmp_path)) == (True, "")
+    ok, output = gates.run_targeted_tests(f"{sys.executable} {script} 1", str(tmp_path))
+    assert not ok
+    assert "chatty" in output
+
+
+def test_run_static_checks_shards_large_trees(tmp_path: Path, monkeypatch):
+    monkeypatch.setattr(_fs, "PARALLEL_MIN_FILES", 2)
+    for i in range(6):
+        (tmp_path / f"ok{i}.py").write_text("x = 1\n")
+    assert gates.run_static_checks(str(tmp_path))[0]
+    (tmp_path / "bad.py").write_text("def broken(:\n")
+    ok, output = gates.run_static_checks(str(tmp_path))
+    assert not ok
+    assert "SyntaxError" in output
 
+
+def test_run_static_checks_skips_unchanged_files(tmp_path: Path, monkeypatch):
+    old = 1_000_000_000
+    for name in ("a.py", "b.py"):
+        (tmp_path / name).write_text("x = 1\n")
+        os.utime(tmp_path / name, ns=(old, old))
+    assert gates.run_static_checks(str(tmp_path))[0]
+
+    compiled = []
+    real_compile_all = gates._compile_all
+
+    def recording_compile_all(py_files, repo_path):
+        compiled.extend(os.path.basename(path) for path in py_files)
+        return real_compile_all(py_files, repo_path)
+
+    monkeypatch.setattr(gates, "_compile_all", recording_compile_all)
+    assert gates.run_static_checks(str(tmp_path)) == (True, "no changes")
+    assert compiled == []
+
+    (tmp_path / "b.py").write_text("def broken(:\n")
+    os.utime(tmp_path / "b.py", ns=(old + 1, old + 1))
+    ok, output = gates.run_static_checks(str(tmp_path))
+    assert not ok and "SyntaxError" in output
+    assert compiled == ["b.py"]
+
+
+def test_run_static_checks_compiles_small_batches_in_process(tmp_path: Path, monkeypatch):
+    def no_subprocess(py_files, repo_path):
+        raise AssertionError("small batches should not start an interpreter")
+
+    monkeypatch.setattr(gates, "_py_compile", no_subprocess)
+    (tmp_path / "ok.py").write_text("x = 1\n")
+    assert gates.run_static_checks(str(tmp_path)) == (True, "")
+    (tmp_path / "bad.py").write_text("def broken(:\n")
+    ok, output = gates.run_static_checks(str(tmp_path))
+    assert not ok
+    assert "SyntaxError" in output and "bad.py" in output
+    # Checking never leaves bytecode behind in the repo under test.
+    assert not (tmp_path / "__pycache__").exists()
@@ -1,17 +1,45 @@
 import json
+import threading
 from pathlib import Path
+from typing import Dict
 
 import pytest
 
 from coding_in_parallel import investigator, llm, types
 
+_MOD_PY = b"def add(x, y):\n    return x-y\n"
+_RECALL_RESPONSE = json.dumps(
+    {
+        "candidates": [
+            {
+                "id": "cand-1",
+                "hypothesis": "The function subtracts instead of adds.",
+                "spans": [
+                    {
+                        "file": "mod.py",
+                        "start_line": 1,
+                        "end_line": 2,
+                        "node_type": "FunctionDef",
+                        "symbol": "add",
+                        "score": 0.8,
+                    }
+                ],
+                "evidence": {"score": 0.8},
+            }
+        ]
+    }
+)
+_PROBE_RESPONSE = json.dumps(
+    {
+        "notes": "Function subtracts instead of adding.",
+        "assumptions": ["inputs are numbers"],
+    }
+)
+
 
 @pytest.fixture()
 def repo_with_bug(tmp_path: Path) -> Path:
-    file_path = tmp_path / "mod.py"
-    file_path.write_text(
-        """def add(x, y):\n    return x-y\n"""
-    )
+    (tmp_path / "mod.py").write_bytes(_MOD_PY)
     return tmp_path
 
 
@@ -26,40 +54,14 @@ def _make_ctx(repo_path: Path) -> types.TaskContext:
     )
 
 
-def test_recall_candidates_parses_llm_output(monkeypatch: pytest.MonkeyPatch, repo_with_bug: Path):
+def test_recall_candidates_parses_llm_output(stub_llm: Dict[str, str], repo_with_bug: Path):
     ctx = _make_ctx(repo_with_bug)
-    response = json.dumps(
-        {
-            "candidates": [
-                {
-                    "id": "cand-1",
-                    "hypothesis": "The function subtracts instead of adds.",
-                    "spans": [
-                        {
-                            "file": "mod.py",
-                            "start_line": 1,
-                            "end_line": 2,
-                            "node_type": "FunctionDef",
-                            "symbol": "add",
-                            "score": 0.8,
-                        }
-                    ],
-                    "evidence": {"score": 0.8},
-                }
-            ]
-        }
-    )
-
-    def fake_complete(prompt: str, **_: object) -> str:
-        assert "Return JSON ONLY" in prompt
-        return response
-
-    monkeypatch.setattr(llm, "complete", fake_complete)
+    stub_llm["Return JSON ONLY"] = _RECALL_RESPONSE
     candidates = investigator.recall_candidates(ctx)
     assert candidates and candidates[0].spans[0].file.endswith("mod.py")
 
 
-def test_probe_appends_notes(monkeypatch: pytest.MonkeyPatch, repo_with_bug: Path):
+def test_probe_appends_notes(stub_llm: Dict[str, str], repo_with_bug: Path):
     ctx = _make_ctx(repo_with_bug)
     candidate = types.Candidate(
         id="cand-1",
@@ -71,19 +73,53 @@ def test_probe_appends_notes(monkeypatch: pytest.MonkeyPatch, repo_with_bug: Pat
         ],
         evidence={},
     )
-    probe_response = json.dumps(
-        {
-            "notes": "Function subtracts instead of adding.",
-            "assumptions": ["inputs are numbers"],
-        }
-    )
+    stub_llm["return a probe JSON object"] = _PROBE_RESPONSE
+    enriched = investigator.probe(ctx, [candidate])
+    assert "probe" in enriched[0].evidence
+    assert "Function subtracts" in enriched[0].evidence["probe"]["notes"]
+
+
+def test_probe_runs_calls_concurrently_in_order(monkeypatch: pytest.MonkeyPatch, repo_with_bug: Path):
+    ctx = _make_ctx(repo_with_bug)
+    candidates = [
+        types.Candidate(id=f"cand-{i}", hypothesis=f"hypothesis {i}", spans=[], evidence={})
+        for i in range(4)
+    ]
+    barrier = threading.Barrier(len(candidates), timeout=5)
 
     def fake_complete(prompt: str, **_: object) -> str:
-        assert "probe" in prompt.lower()
-        return probe_response
+        barrier.wait()  # only passes if all calls are in flight at once
+        index = next(i for i in range(len(candidates)) if f"hypothesis {i}" in prompt)
+        return json.dumps({"notes": f"notes {index}"})
 
+    monkeypatch.setenv("CIP_LLM_CONCURRENCY", str(len(candidates)))
     monkeypatch.setattr(llm, "complete", fake_complete)
-    enriched = investigator.probe(ctx, [candidate])
-    assert "probe" in enriched[0].evidence
-    assert "Function subtracts" in enriched[0].evidence["probe"]["notes"]
+    enriched = investigator.probe(ctx, candidates)
+    assert [c.evidence["probe"]["notes"] for c in enriched] == [f"notes {i}" for i in range(4)]
+
+
+def test_candidates_to_suspects_keeps_top_k_in_stable_order():
+    spans = [
+        types.AstSpan(file="mod.py", start_line=i, end_line=i, node_type="FunctionDef", score=score)
+        for i, score in enumerate([0.2, None, 0.9, 0.5, 0.9], start=1)
+    ]
+    cand = types.Candidate(id="c", hypothesis="", spans=spans, evidence={})
+    suspects = investigator._candidates_to_suspects([cand], k=3)
+    assert [n.span.start_line for n in suspects] == [3, 5, 2]
+    assert [n.suspicion for n in suspects] == [0.9, 0.9, 0.5]
+
 
+@pytest.mark.parametrize(
+    "payload",
+    [
+        {"candidates": ["not-an-object"]},
+        {"candidates": [{"id": "c", "spans": "mod.py"}]},
+        {"candidates": [{"id": "c", "spans": [{"file": "mod.py"}]}]},
+    ],
+)
+def test_recall_candidates_rejects_malformed_candidates(
+    monkeypatch: pytest.MonkeyPatch, repo_with_bug: Path, payload: dict
+):
+    monkeypatch.setattr(llm, "complete", lambda prompt, **_: json.dumps(payload))
+    with pytest.raises(ValueError, match="Malformed recall candidate #1"):
+        investigator.recall_candidates(_make_ctx(repo_with_bug))
@@ -1,8 +1,13 @@
+from pathlib import Path
+
+import pytest
+
 from coding_in_parallel import llm
 
 
 class DummyClient:
-    def __init__(self):
+    def __init__(self, model: str = "dummy"):
+        self.model = model
         self.seen = []
 
     def complete(self, prompt: str, **_: object) -> str:
@@ -16,3 +21,30 @@ def test_set_client_overrides_default():
     llm.complete("hello")
     assert dummy.seen == ["hello"]
 
+
+def test_complete_caches_responses_when_enabled(monkeypatch: pytest.MonkeyPatch, tmp_path: Path):
+    monkeypatch.setenv("CIP_LLM_CACHE", "1")
+    monkeypatch.setenv("CIP_LLM_CACHE_PATH", str(tmp_path / "llm-cache.sqlite"))
+    dummy = DummyClient()
+    llm.set_client(dummy)
+    assert llm.complete("hello") == "{}"
+    assert llm.complete("hello") == "{}"
+    assert dummy.seen == ["hello"]
+    llm.complete("hello", temperature=0.2)
+    assert dummy.seen == ["hello", "hello"]
+    assert (tmp_path / "llm-cache.sqlite").exists()
+
+
+def test_complete_cache_separates_models_and_honours_cache_false(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+):
+    monkeypatch.setenv("CIP_LLM_CACHE", "1")
+    monkeypatch.setenv("CIP_LLM_CACHE_PATH", str(tmp_path / "llm-cache.sqlite"))
+    first, second = DummyClient("model-a"), DummyClient("model-b")
+    llm.set_client(first)
+    llm.complete("hello")
+    llm.set_client(second)
+    llm.complete("hello")
+    assert second.seen == ["hello"]
+    llm.complete("hello", cache=False)
+    assert second.seen == ["hello", "hello"]
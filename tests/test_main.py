@@ -1,28 +1,12 @@
 import json
 from pathlib import Path
-import subprocess
 
 import pytest
 
 from coding_in_parallel import controller, main, types
 
 
-def _init_repo(path: Path) -> None:
-    subprocess.run(["git", "init"], cwd=path, check=True, capture_output=True)
-    subprocess.run(["git", "config", "user.email", "test@example.com"], cwd=path, check=True)
-    subprocess.run(["git", "config", "user.name", "Test User"], cwd=path, check=True)
-    (path / "mod.py").write_text("def add(x, y):\n    return x - y\n")
-    subprocess.run(["git", "add", "mod.py"], cwd=path, check=True)
-    subprocess.run(["git", "commit", "-m", "init"], cwd=path, check=True, capture_output=True)
-
-
-@pytest.fixture()
-def repo(tmp_path: Path) -> Path:
-    _init_repo(tmp_path)
-    return tmp_path
-
-
-def test_main_cli_writes_patch_file(monkeypatch: pytest.MonkeyPatch, tmp_path: Path, repo: Path):
+def test_main_cli_writes_patch_file(monkeypatch: pytest.MonkeyPatch, tmp_path: Path, plain_repo: Path):
     instance = {
         "instance_id": "example-1",
         "test_cmd": "pytest -k add",
@@ -44,7 +28,7 @@ def test_main_cli_writes_patch_file(monkeypatch: pytest.MonkeyPatch, tmp_path: P
 
     main.main([
         "--repo",
-        str(repo),
+        str(plain_repo),
         "--task",
         str(instance_path),
         "--out",
@@ -0,0 +1,37 @@
+import string
+from pathlib import Path
+
+import pytest
+
+from coding_in_parallel.prompting import PROMPT_DIR, PromptTemplate
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "plain text",
+        'task {instance_id}: {{"candidates":[{{"id":"x"}}]}} tests {failing_tests}',
+        "{a}{b}{a}",
+        "value {a!r:>10} and {b.real}",
+    ],
+)
+def test_prompt_template_matches_str_format(text: str):
+    kwargs = {"instance_id": "demo-1", "failing_tests": ["t::a"], "a": "x", "b": 3}
+    used = {k: v for k, v in kwargs.items() if "{" + k in text}
+    assert PromptTemplate(text).format(**used) == text.format(**used)
+
+
+def test_prompt_template_renders_shipped_prompts():
+    for path in sorted(PROMPT_DIR.glob("*.txt")):
+        text = path.read_text().strip()
+        fields = {name: f"<{name}>" for _, name, _, _ in string.Formatter().parse(text) if name}
+        assert PromptTemplate(text).format(**fields) == text.format(**fields)
+
+
+def test_prompt_template_missing_field_raises_key_error():
+    with pytest.raises(KeyError):
+        PromptTemplate("{missing}").format()
+
+
+def test_prompt_dir_points_at_repo_prompts():
+    assert PROMPT_DIR == Path(__file__).resolve().parents[1] / "prompts"
@@ -1,28 +1,25 @@
 import json
 from pathlib import Path
+from typing import Dict
 
 import pytest
 
 from coding_in_parallel import config as config_module, llm, proposer, types
 
+_PROPOSE_RESPONSE = json.dumps(
+    [
+        {
+            "step_id": "step-1",
+            "unified_diff": "diff --git a/mod.py b/mod.py\n@@\n-def add(x, y):\n-    return x - y\n+def add(x, y):\n+    return x + y\n",
+            "rationale": "Swap subtraction for addition",
+        }
+    ]
+)
 
-def test_propose_returns_diff_list(monkeypatch: pytest.MonkeyPatch, tmp_path: Path):
-    (tmp_path / "mod.py").write_text("def add(x, y):\n    return x - y\n")
-    response = json.dumps(
-        [
-            {
-                "step_id": "step-1",
-                "unified_diff": "diff --git a/mod.py b/mod.py\n@@\n-def add(x, y):\n-    return x - y\n+def add(x, y):\n+    return x + y\n",
-                "rationale": "Swap subtraction for addition",
-            }
-        ]
-    )
-
-    def fake_complete(prompt: str, **_: object) -> str:
-        assert "Output JSON ONLY" in prompt
-        return response
 
-    monkeypatch.setattr(llm, "complete", fake_complete)
+def test_propose_returns_diff_list(stub_llm: Dict[str, str], tmp_path: Path):
+    (tmp_path / "mod.py").write_text("def add(x, y):\n    return x - y\n")
+    stub_llm["Output JSON ONLY"] = _PROPOSE_RESPONSE
     step = types.PlanStep(
         id="step-1",
         intent="Fix add",
@@ -43,3 +40,46 @@ def test_propose_returns_diff_list(monkeypatch: pytest.MonkeyPatch, tmp_path: Pa
     )
     assert proposals and proposals[0].rationale.startswith("Swap")
 
+
+def test_propose_prompt_puts_step_specific_text_last(monkeypatch: pytest.MonkeyPatch):
+    prompts = []
+    monkeypatch.setattr(llm, "complete", lambda prompt, **_: prompts.append(prompt) or "[]")
+    step = types.PlanStep(
+        id="step-1",
+        intent="Fix add",
+        target_spans=[types.AstSpan(file="mod.py", start_line=1, end_line=2, node_type="FunctionDef")],
+        constraints=[],
+        ideal_outcome="add returns sum",
+        check="tests",
+    )
+    proposer.propose(step, {"mod.py": "LINES 1-2: ..."}, config=config_module.Config.default())
+    # Shared instructions and context lead so provider prefix caches can reuse them.
+    prompt = prompts[0]
+    assert prompt.index("Output JSON ONLY") < prompt.index("FILE: mod.py") < prompt.index("- mod.py:1-2")
+    assert prompt.rstrip().endswith("Plan intent: Fix add")
+
+
+def test_format_span_summary_lists_each_span():
+    spans = [
+        types.AstSpan(file="mod.py", start_line=1, end_line=2, node_type="FunctionDef", symbol="add"),
+        types.AstSpan(file="mod.py", start_line=5, end_line=9, node_type="ClassDef"),
+    ]
+    step = types.PlanStep(
+        id="step-1", intent="", target_spans=spans, constraints=[], ideal_outcome="", check="tests"
+    )
+    assert proposer._format_span_summary(step) == (
+        "- mod.py:1-2 (FunctionDef add)\n- mod.py:5-9 (ClassDef)"
+    )
+    empty = types.PlanStep(
+        id="step-2", intent="", target_spans=[], constraints=[], ideal_outcome="", check="tests"
+    )
+    assert proposer._format_span_summary(empty) == "- (no target spans provided)"
+
+
+def test_propose_rejects_non_json_output(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(llm, "complete", lambda prompt, **_: "not json")
+    step = types.PlanStep(
+        id="step-1", intent="", target_spans=[], constraints=[], ideal_outcome="", check="tests"
+    )
+    with pytest.raises(ValueError, match="non-JSON"):
+        proposer.propose(step, {}, config=config_module.Config.default())
@@ -4,22 +4,12 @@ from pathlib import Path
 
 import pytest
 
-from coding_in_parallel import config as config_module, gates, tnr, types, validate, vcs
+from coding_in_parallel import config as config_module, gates, tnr, types, vcs
 
-
-def _init_git_repo(path: Path) -> None:
-    subprocess.run(["git", "init"], cwd=path, check=True, capture_output=True)
-    subprocess.run(["git", "config", "user.email", "test@example.com"], cwd=path, check=True)
-    subprocess.run(["git", "config", "user.name", "Test User"], cwd=path, check=True)
-    (path / "mod.py").write_text("def add(x, y):\n    return x - y\n")
-    subprocess.run(["git", "add", "mod.py"], cwd=path, check=True)
-    subprocess.run(["git", "commit", "-m", "init"], cwd=path, check=True, capture_output=True)
-
-
-@pytest.fixture()
-def git_repo(tmp_path: Path) -> Path:
-    _init_git_repo(tmp_path)
-    return tmp_path
+# Config is frozen; tests derive variants with dataclasses.replace.
+_DEFAULT_CFG = config_module.Config.default()
+# Indirect parameter for ``stub_gates``: static checks fail, tests still pass.
+_FAILING_STATIC = {"static": lambda repo: (False, "syntax error")}
 
 
 def _make_context(repo_path: Path) -> types.TaskContext:
@@ -33,96 +23,185 @@ def _make_context(repo_path: Path) -> types.TaskContext:
     )
 
 
-def test_txn_patch_commits_when_checks_pass(monkeypatch: pytest.MonkeyPatch, git_repo: Path):
-    ctx = _make_context(git_repo)
-    cfg = config_module.Config.default()
-    step = types.PlanStep(
-        id="step-1",
-        intent="Fix add",
-        target_spans=[
-            types.AstSpan(file="mod.py", start_line=1, end_line=2, node_type="FunctionDef"),
-        ],
-        constraints=[],
-        ideal_outcome="add sums",
-        check="tests",
-    )
-    diff = """diff --git a/mod.py b/mod.py\n@@ -1,2 +1,2 @@\n-def add(x, y):\n-    return x - y\n+def add(x, y):\n+    return x + y\n"""
+@pytest.mark.parametrize(
+    "stub_gates, diff_kind, targeted_tests, committed, source, log",
+    [
+        pytest.param({}, "add_fix", True, True, "return x + y", None, id="commits"),
+        pytest.param(
+            _FAILING_STATIC, "add_fix", True, False, "return x - y", "static checks failed", id="static-fails"
+        ),
+        pytest.param({}, "add_dead_code", False, False, "return x - y", "mu worsened", id="mu-worsens"),
+    ],
+    indirect=["stub_gates"],
+)
+def test_txn_patch_commits_or_rolls_back(
+    stub_gates: None,
+    repo: Path,
+    add_step: types.PlanStep,
+    make_diff,
+    diff_kind: str,
+    targeted_tests: bool,
+    committed: bool,
+    source: str,
+    log: str | None,
+):
+    ctx = _make_context(repo)
+    cfg = replace(_DEFAULT_CFG, gates=replace(_DEFAULT_CFG.gates, targeted_tests=targeted_tests))
+
+    result = tnr.txn_patch(ctx, add_step, [make_diff(add_step.id, diff_kind)], config=cfg)
+
+    assert result.committed is committed
+    assert (repo / "mod.py").read_text() == f"def add(x, y):\n    {source}\n"
+    if log is None:
+        assert result.mu_post == 0
+    else:
+        assert any(entry.startswith(log) for entry in result.logs)
+
+
+def test_numstat_restricts_to_requested_paths(repo: Path):
+    (repo / "other.py").write_text("x = 1\n")
+    subprocess.run(["git", "add", "other.py"], cwd=repo, check=True)
+    subprocess.run(["git", "commit", "-m", "other"], cwd=repo, check=True, capture_output=True)
+    (repo / "mod.py").write_text("def add(x, y):\n    return x + y\n")
+    (repo / "other.py").write_text("x = 2\ny = 3\nz = 4\n")
+
+    assert tnr._numstat(str(repo)) == {"mod.py": 1, "other.py": 2}
+    assert tnr._numstat(str(repo), ["mod.py"]) == {"mod.py": 1}
+    assert tnr._numstat(str(repo), []) == {}
+    assert tnr._measure_mu(str(repo)) == 3
+
+
+@pytest.mark.usefixtures("stub_gates")
+def test_txn_patch_parallel_attempts_commits_earliest_passing(
+    monkeypatch: pytest.MonkeyPatch, repo: Path, add_step: types.PlanStep
+):
+    ctx = _make_context(repo)
+    cfg = replace(_DEFAULT_CFG, tnr=replace(_DEFAULT_CFG.tnr, parallel_attempts=3))
+
+    def make_diff(body: str) -> str:
+        return f"diff --git a/mod.py b/mod.py\n@@ -1,2 +1,2 @@\n def add(x, y):\n-    return x - y\n+    {body}\n"
+
+    proposals = [
+        types.DiffProposal(step_id=add_step.id, unified_diff=make_diff(body), rationale=body)
+        for body in ("return x * y", "return y + x", "return x + y")
+    ]
+    seen_repos = set()
+
+    def fake_tests(cmd: str, repo: str):
+        seen_repos.add(repo)
+        source = (Path(repo) / "mod.py").read_text()
+        return ("x - y" in source or "+" in source), source
+
+    monkeypatch.setattr(gates, "run_targeted_tests", fake_tests)
+
+    result = tnr.txn_patch(ctx, add_step, proposals, config=cfg)
 
-    monkeypatch.setattr(gates, "run_static_checks", lambda repo: (True, "ok"))
-    monkeypatch.setattr(gates, "run_targeted_tests", lambda cmd, repo: (True, "tests pass"))
-
-    result = tnr.txn_patch(
-        ctx,
-        step,
-        [types.DiffProposal(step_id=step.id, unified_diff=diff, rationale="fix")],
-        config=cfg,
-    )
     assert result.committed
-    assert result.mu_post == 0
-    assert "return x + y" in (git_repo / "mod.py").read_text()
-
-
-def test_txn_patch_rolls_back_on_failure(monkeypatch: pytest.MonkeyPatch, git_repo: Path):
-    ctx = _make_context(git_repo)
-    cfg = config_module.Config.default()
-    step = types.PlanStep(
-        id="step-1",
-        intent="Fix add",
-        target_spans=[
-            types.AstSpan(file="mod.py", start_line=1, end_line=2, node_type="FunctionDef"),
-        ],
-        constraints=[],
-        ideal_outcome="add sums",
-        check="tests",
+    assert result.applied_diff is proposals[1]
+    assert (repo / "mod.py").read_text() == "def add(x, y):\n    return y + x\n"
+    assert [log.split(":")[0] for log in result.logs] == ["targeted tests failed"]
+    assert seen_repos - {str(repo)}
+    worktrees = subprocess.run(
+        ["git", "worktree", "list"], cwd=repo, check=True, capture_output=True, text=True
+    ).stdout
+    assert len(worktrees.splitlines()) == 1
+
+
+@pytest.mark.usefixtures("stub_gates")
+def test_txn_patch_parallel_measures_mu_pre_on_clean_head(
+    repo: Path, add_step: types.PlanStep, add_fix: types.DiffProposal
+):
+    ctx = _make_context(repo)
+    cfg = replace(
+        _DEFAULT_CFG,
+        gates=replace(_DEFAULT_CFG.gates, targeted_tests=False),
+        tnr=replace(_DEFAULT_CFG.tnr, parallel_attempts=2),
     )
-    bad_diff = """diff --git a/mod.py b/mod.py\n@@ -1,2 +1,2 @@\n-def add(x, y):\n-    return x - y\n+def add(x, y)::\n+    return x + y\n"""
+    with (repo / "mod.py").open("a") as handle:
+        handle.write("\n\ndef unused():\n    return 0\n")
 
-    monkeypatch.setattr(gates, "run_static_checks", lambda repo: (False, "syntax error"))
-    monkeypatch.setattr(gates, "run_targeted_tests", lambda cmd, repo: (True, "tests pass"))
+    result = tnr.txn_patch(ctx, add_step, [add_fix], config=cfg)
 
-    with pytest.raises(validate.ValidationError):
-        validate.require_unified_diff(bad_diff)
+    assert not result.committed
+    assert result.mu_pre == 0
+    assert "mu worsened from 0 to 1; rolling back." in result.logs
 
-    # Provide a valid diff but fail gates.
-    diff = """diff --git a/mod.py b/mod.py\n@@ -1,2 +1,2 @@\n-def add(x, y):\n-    return x - y\n+def add(x, y):\n+    return x + y\n"""
-    monkeypatch.setattr(gates, "run_static_checks", lambda repo: (False, "syntax error"))
 
-    result = tnr.txn_patch(
-        ctx,
-        step,
-        [types.DiffProposal(step_id=step.id, unified_diff=diff, rationale="fix")],
-        config=cfg,
-    )
+@pytest.mark.usefixtures("stub_gates")
+def test_txn_patch_parallel_reapply_failure_is_not_committed(
+    monkeypatch: pytest.MonkeyPatch, repo: Path, add_step: types.PlanStep, add_fix: types.DiffProposal
+):
+    ctx = _make_context(repo)
+    cfg = replace(_DEFAULT_CFG, tnr=replace(_DEFAULT_CFG.tnr, parallel_attempts=2))
+    apply_diff = vcs.apply_diff
+
+    def flaky_apply(diff: str, repo_path: str) -> None:
+        if repo_path == str(repo):
+            raise RuntimeError("patch does not apply")
+        apply_diff(diff, repo_path)
+
+    monkeypatch.setattr(vcs, "apply_diff", flaky_apply)
+    head = vcs.checkpoint(str(repo))
+
+    result = tnr.txn_patch(ctx, add_step, [add_fix], config=cfg)
+
     assert not result.committed
-    assert "return x - y" in (git_repo / "mod.py").read_text()
-
-
-def test_txn_patch_rolls_back_when_mu_worsens(monkeypatch: pytest.MonkeyPatch, git_repo: Path):
-    ctx = _make_context(git_repo)
-    cfg = config_module.Config.default()
-    cfg = replace(cfg, gates=replace(cfg.gates, targeted_tests=False))
-    step = types.PlanStep(
-        id="step-1",
-        intent="Add dead code",
-        target_spans=[
-            types.AstSpan(file="mod.py", start_line=1, end_line=2, node_type="FunctionDef"),
-        ],
-        constraints=[],
-        ideal_outcome="", 
-        check="",
-    )
-    diff = """diff --git a/mod.py b/mod.py\n@@ -1,2 +1,5 @@\n def add(x, y):\n-    return x - y\n+    return x - y\n+\n+def helper():\n+    return 41\n"""
+    assert result.logs[-1] == "git apply failed: patch does not apply"
+    assert vcs.checkpoint(str(repo)) == head
+    assert "return x - y" in (repo / "mod.py").read_text()
 
-    monkeypatch.setattr(gates, "run_static_checks", lambda repo: (True, "ok"))
 
-    result = tnr.txn_patch(
-        ctx,
-        step,
-        [types.DiffProposal(step_id=step.id, unified_diff=diff, rationale="noop")],
-        config=cfg,
-    )
+@pytest.mark.usefixtures("stub_gates")
+def test_txn_patch_parallel_rechecks_static_gate_in_primary_tree(
+    monkeypatch: pytest.MonkeyPatch, repo: Path, add_step: types.PlanStep, add_fix: types.DiffProposal
+):
+    ctx = _make_context(repo)
+    cfg = replace(_DEFAULT_CFG, tnr=replace(_DEFAULT_CFG.tnr, parallel_attempts=2))
+    checked = []
+
+    def static_fails_in_primary(repo_path: str):
+        checked.append(repo_path)
+        return repo_path != str(repo), "missing build artifact"
+
+    monkeypatch.setattr(gates, "run_static_checks", static_fails_in_primary)
+    head = vcs.checkpoint(str(repo))
+
+    result = tnr.txn_patch(ctx, add_step, [add_fix], config=cfg)
+
     assert not result.committed
-    assert any("mu worsened" in log for log in result.logs)
-    assert "helper" not in (git_repo / "mod.py").read_text()
+    assert checked[-1] == str(repo) and len(checked) == 2
+    assert result.logs[-1] == "static checks failed in primary tree: missing build artifact"
+    assert vcs.checkpoint(str(repo)) == head
+    assert "return x - y" in (repo / "mod.py").read_text()
+
+
+@pytest.mark.parametrize("stub_gates", [_FAILING_STATIC], indirect=True)
+def test_txn_patch_reverts_once_per_failed_attempt(
+    stub_gates: None,
+    monkeypatch: pytest.MonkeyPatch, repo: Path, add_step: types.PlanStep, add_fix: types.DiffProposal
+):
+    ctx = _make_context(repo)
+    reverts = []
+    real_revert = vcs.revert
+
+    def counting_revert(repo: str, commit_id: str) -> None:
+        reverts.append(commit_id)
+        real_revert(repo, commit_id)
+
+    monkeypatch.setattr(vcs, "revert", counting_revert)
+
+    result = tnr.txn_patch(ctx, add_step, [add_fix, add_fix], config=_DEFAULT_CFG)
+
+    assert not result.committed
+    assert len(reverts) == 2
+    assert "return x - y" in (repo / "mod.py").read_text()
+
 
+def test_numstat_skips_binary_files(repo: Path):
+    (repo / "blob.bin").write_bytes(b"\x00\x01")
+    subprocess.run(["git", "add", "blob.bin"], cwd=repo, check=True)
+    subprocess.run(["git", "commit", "-m", "blob"], cwd=repo, check=True, capture_output=True)
+    (repo / "blob.bin").write_bytes(b"\x00\x02\x03")
+    (repo / "mod.py").write_text("def add(x, y):\n    return x + y\n")
 
+    assert tnr._numstat(str(repo)) == {"mod.py": 1}
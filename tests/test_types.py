@@ -1,4 +1,5 @@
 import dataclasses
+import pickle
 
 import pytest
 
@@ -42,3 +43,56 @@ def test_plan_step_check_enum():
     assert step.check in {"compile", "lint", "tests", "custom"}
 
 
+def test_ast_span_is_slotted():
+    span = types.AstSpan(file="example.py", start_line=1, end_line=2, node_type="FunctionDef")
+    assert not hasattr(span, "__dict__")
+
+
+def test_candidate_node_plan_and_landmark_are_slotted():
+    span = types.AstSpan(file="example.py", start_line=1, end_line=2, node_type="FunctionDef")
+    instances = [
+        types.Candidate(id="c1", hypothesis="", spans=[span]),
+        types.Node(id="n1", span=span, kind="functiondef", hop=0, in_stack=False, suspicion=0.5),
+        types.PlanStep(id="s1", intent="", target_spans=[span], constraints=[], ideal_outcome="", check="tests"),
+        types.Landmark(
+            id="lm1", intent="", target_spans=[span], constraints=[], landmark_test="pytest",
+            rollback_on=[], risk="low", confidence=0.5,
+        ),
+    ]
+    for instance in instances:
+        assert not hasattr(instance, "__dict__")
+
+
+def test_all_types_are_slotted_and_pickle():
+    span = types.AstSpan(file="example.py", start_line=1, end_line=2, node_type="FunctionDef")
+    instances = [
+        types.Understanding(summary="", invariants=[], dependencies=[]),
+        types.DiffProposal(step_id="s1", unified_diff="", rationale="why"),
+        types.Subgraph(nodes=[], edges=[("a", "b", "calls")], slices={}),
+        types.ProbePatch(id="p1", suspect_id="n1", diff="", purpose="assert", loc_changed=1, rationale=""),
+        types.ProbeReport(
+            id="r1", suspect_id="n1", result="informative", info_gain=0.5,
+            recommendation="possible", observations={}, artifacts=[],
+        ),
+        types.Blackboard(invariants=["x > 0"]),
+        types.FailurePattern(
+            summary="", primary_location=span, alternatives=[], invariants=[], confidence=0.5,
+            assumptions_to_check=[], temporary_props=[],
+        ),
+        types.TaskContext(
+            repo_path=".", failing_tests=[], test_cmd="pytest", targeted_expr=None,
+            instance_id="i1", metadata={},
+        ),
+    ]
+    for instance in instances:
+        assert not hasattr(instance, "__dict__")
+        assert pickle.loads(pickle.dumps(instance)) == instance
+
+
+def test_diff_proposal_and_understanding_are_frozen():
+    proposal = types.DiffProposal(step_id="s1", unified_diff="")
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        proposal.unified_diff = "changed"  # type: ignore[misc]
+    understanding = types.Understanding(summary="", invariants=[], dependencies=[])
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        understanding.summary = "changed"  # type: ignore[misc]
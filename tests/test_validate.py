@@ -1,3 +1,5 @@
+from contextlib import nullcontext
+
 import pytest
 
 from coding_in_parallel import types, validate
@@ -10,27 +12,25 @@ VALID_DIFF = """diff --git a/mod.py b/mod.py
 +def add(x, y):
 +    return x + y
 """
+# The fix with a mangled signature line, as a model might emit it.
+_BAD_SIGNATURE_DIFF = """diff --git a/mod.py b/mod.py\n@@ -1,2 +1,2 @@\n-def add(x, y):\n-    return x - y\n+def add(x, y)::\n+    return x + y\n"""
+# The same change, but to a file outside the allowed set.
+_OTHER_FILE_DIFF = VALID_DIFF.replace("b/mod.py", "b/other.py")
 
 
 def test_validate_diff_succeeds_for_well_formed_diff():
     validate.require_unified_diff(VALID_DIFF)
 
 
-def test_within_limits_counts_changed_lines():
+@pytest.mark.parametrize(
+    "diff, should_raise",
+    [(VALID_DIFF, False), (_OTHER_FILE_DIFF, True)],
+    ids=["within-limits", "file-outside-allowed-set"],
+)
+def test_within_limits_checks_allowed_files(diff: str, should_raise: bool):
     span = types.AstSpan(file="mod.py", start_line=1, end_line=4, node_type="FunctionDef")
-    validate.ensure_within_limits(
-        VALID_DIFF,
-        allowed_files={"mod.py"},
-        max_loc=6,
-        max_files=1,
-        target_spans=[span],
-    )
-
-
-def test_within_limits_raises_for_too_many_files():
-    diff = VALID_DIFF.replace("b/mod.py", "b/other.py")
-    span = types.AstSpan(file="mod.py", start_line=1, end_line=4, node_type="FunctionDef")
-    with pytest.raises(validate.ValidationError):
+    expectation = pytest.raises(validate.ValidationError) if should_raise else nullcontext()
+    with expectation:
         validate.ensure_within_limits(
             diff,
             allowed_files={"mod.py"},
@@ -40,6 +40,11 @@ def test_within_limits_raises_for_too_many_files():
         )
 
 
+def test_validate_rejects_malformed_signature_diff():
+    with pytest.raises(validate.ValidationError):
+        validate.require_unified_diff(_BAD_SIGNATURE_DIFF)
+
+
 def test_within_limits_rejects_lines_outside_span():
     diff = """diff --git a/mod.py b/mod.py\n@@ -50,0 +50,2 @@\n+print('out of range')\n"""
     span = types.AstSpan(file="mod.py", start_line=1, end_line=10, node_type="Module")
@@ -82,3 +87,75 @@ def test_api_guard_rejects_signature_changes():
         allow_api_change=True,
     )
 
+
+def test_span_map_merges_overlapping_ranges_for_bisect_lookup():
+    spans = [
+        types.AstSpan(file="mod.py", start_line=20, end_line=25, node_type="FunctionDef"),
+        types.AstSpan(file="mod.py", start_line=1, end_line=4, node_type="FunctionDef"),
+        types.AstSpan(file="mod.py", start_line=3, end_line=8, node_type="FunctionDef"),
+    ]
+    ranges = validate._span_map(spans, padding=1)
+    assert ranges == {"mod.py": ([1, 19], [9, 26])}
+    assert validate._line_allowed(ranges["mod.py"], 9)
+    assert not validate._line_allowed(ranges["mod.py"], 10)
+    assert not validate._line_allowed(ranges.get("other.py"), 1)
+
+
+def test_within_limits_uses_prepared_spans():
+    span = types.AstSpan(file="mod.py", start_line=10, end_line=12, node_type="FunctionDef")
+    prepared = validate.prepare_spans([span], padding_lines=0)
+    assert prepared.span_files == frozenset({"mod.py"})
+    # The prepared lookups win over target_spans, so line 1 is out of range.
+    with pytest.raises(validate.ValidationError, match="outside allowed spans"):
+        validate.ensure_within_limits(
+            VALID_DIFF,
+            allowed_files=frozenset({"mod.py"}),
+            max_loc=6,
+            max_files=1,
+            target_spans=[],
+            prepared=prepared,
+        )
+    validate.ensure_within_limits(
+        VALID_DIFF,
+        allowed_files=frozenset({"mod.py"}),
+        max_loc=6,
+        max_files=1,
+        target_spans=[],
+        prepared=validate.prepare_spans([span], padding_lines=9),
+    )
+
+
+@pytest.mark.parametrize(
+    "line, suspicious",
+    [
+        ("+def add(x, y)::", True),
+        ("+class Thing::  ", True),
+        ("  +def add(x, y)::\r", True),
+        ("+def add(x, y):", False),
+        (" def add(x, y)::", False),
+        ("+    return {'a':: 1}", False),
+    ],
+)
+def test_require_unified_diff_flags_double_colon_headers(line: str, suspicious: bool):
+    diff = f"diff --git a/mod.py b/mod.py\n@@ -1 +1 @@\n-def add(x, y):\n{line}\n"
+    if suspicious:
+        with pytest.raises(validate.ValidationError, match="double-colon"):
+            validate.require_unified_diff(diff)
+    else:
+        validate.require_unified_diff(diff)
+
+
+def test_count_changed_loc_matches_line_scan():
+    diff = VALID_DIFF.replace("@@ -1,2 +1,2 @@", "--- a/mod.py\n+++ b/mod.py\n@@ -1,2 +1,2 @@") + " context\r\n-x"
+    expected = sum(1 for line in diff.splitlines() if line.startswith(("+", "-")))
+    assert validate._count_changed_loc(diff) == expected == 7
+
+
+def test_within_limits_reports_whole_diff_limits_before_line_errors():
+    diff = "diff --git a/mod.py b/mod.py\n@@ bad\n-a\n+b\n-c\n+d\n"
+    span = types.AstSpan(file="mod.py", start_line=1, end_line=4, node_type="FunctionDef")
+    kwargs = dict(allowed_files={"mod.py"}, max_files=1, target_spans=[span])
+    with pytest.raises(validate.ValidationError, match="too many lines"):
+        validate.ensure_within_limits(diff, max_loc=3, **kwargs)
+    with pytest.raises(validate.ValidationError, match="Malformed hunk header"):
+        validate.ensure_within_limits(diff, max_loc=4, **kwargs)
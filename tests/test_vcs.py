@@ -1,23 +1,51 @@
-import subprocess
 from pathlib import Path
 
 from coding_in_parallel import vcs
 
 
-def _init_repo(path: Path) -> None:
-    subprocess.run(["git", "init"], cwd=path, check=True, capture_output=True)
-    subprocess.run(["git", "config", "user.email", "test@example.com"], cwd=path, check=True)
-    subprocess.run(["git", "config", "user.name", "Test User"], cwd=path, check=True)
-    (path / "file.txt").write_text("hello\n")
-    subprocess.run(["git", "add", "file.txt"], cwd=path, check=True)
-    subprocess.run(["git", "commit", "-m", "init"], cwd=path, check=True, capture_output=True)
+def test_apply_and_final_patch(repo: Path):
+    diff = """diff --git a/mod.py b/mod.py\n@@\n def add(x, y):\n-    return x - y\n+    return x + y\n"""
+    vcs.apply_diff(diff, str(repo))
+    patch = vcs.final_patch(str(repo))
+    assert "+    return x + y" in patch
 
 
-def test_apply_and_final_patch(tmp_path: Path):
-    _init_repo(tmp_path)
-    diff = """diff --git a/file.txt b/file.txt\n@@\n-hello\n+hello world\n"""
-    vcs.apply_diff(diff, str(tmp_path))
-    patch = vcs.final_patch(str(tmp_path))
-    assert "hello world" in patch
-    vcs.revert(str(tmp_path), vcs.checkpoint(str(tmp_path)))
+def test_revert_to_checkpoint_discards_working_changes(repo: Path):
+    head = vcs.checkpoint(str(repo))
+    (repo / "mod.py").write_text("def add(x, y):\n    return x + y\n")
+    (repo / "scratch.py").write_text("x = 1\n")
+    vcs.revert(str(repo), head)
+    assert (repo / "mod.py").read_text() == "def add(x, y):\n    return x - y\n"
+    assert not (repo / "scratch.py").exists()
+    assert vcs.checkpoint(str(repo)) == head
 
+
+def test_normalize_diff_adds_missing_headers_and_keeps_complete_diffs():
+    bare = "diff --git a/file.txt b/file.txt\n@@ -1 +1 @@\n-hello\n+hello world\n"
+    complete = (
+        "diff --git a/file.txt b/file.txt\n--- a/file.txt\n+++ b/file.txt\n"
+        "@@ -1 +1 @@\n-hello\n+hello world\n"
+    )
+    assert vcs._normalize_diff(bare) == complete
+    assert vcs._normalize_diff(complete) is complete
+    assert vcs._normalize_diff(complete.replace("\n", "\r\n")) == complete
+
+
+def test_manual_apply_writes_each_file_once_and_keeps_mode(tmp_path: Path, monkeypatch):
+    script = tmp_path / "run.sh"
+    script.write_text("echo one\necho two\n")
+    script.chmod(0o755)
+    diff = (
+        "diff --git a/run.sh b/run.sh\n@@ -1 +1 @@\n-echo one\n+echo uno\n"
+        "diff --git a/run.sh b/run.sh\n@@ -2 +2 @@\n echo uno\n-echo two\n+echo dos\n"
+    )
+    replaced = []
+    real_replace = vcs.os.replace
+    monkeypatch.setattr(vcs.os, "replace", lambda src, dst: (replaced.append(dst), real_replace(src, dst)))
+
+    vcs._manual_apply(diff, str(tmp_path))
+
+    assert script.read_text() == "echo uno\necho dos\n"
+    assert replaced == [script]
+    assert script.stat().st_mode & 0o777 == 0o755
+    assert [p.name for p in tmp_path.iterdir()] == ["run.sh"]